@@ -1,30 +1,51 @@
+import os
 import sys
+import threading
 import time
 import random
 import decimal
+from collections import OrderedDict
 
-from PyQt5.QtCore import Qt, QTimer
-from PyQt5.QtGui import QFont
+# Отсчет времени до первого кадра начинается до загрузки Qt
+STARTED = time.perf_counter()
+
+from PyQt5.QtCore import Qt, QTimer, QThread, QObject, pyqtSignal
+from PyQt5.QtGui import QFont, QKeySequence
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout,
     QHBoxLayout, QLabel, QPushButton, QLineEdit,
-    QMessageBox, QGridLayout, QScrollArea, QComboBox
+    QMessageBox, QScrollArea, QComboBox, QDialog,
+    QTableWidget, QTableWidgetItem, QShortcut
 )
 
-from logic import Game_Solitaire
+from logic import (
+    Game_Solitaire, DRAW, WASTE_TO_TABLEAU, WASTE_TO_FOUNDATION,
+    TABLEAU_TO_TABLEAU, TABLEAU_TO_FOUNDATION
+)
+import perf
+import solver
+import replay
+from dealpool import DealPool
+from board import BoardWidget
 
 DB_AVAILABLE = None
 DB_manage = None
+DB_writer = None
+
+REPLAY_DIR = 'replays'
+# Пауза между картами при доигрывании, мс
+AUTOPLAY_INTERVAL = 60
 
 
 def import_database():
-    global DB_AVAILABLE, DB_manage
+    global DB_AVAILABLE, DB_manage, DB_writer
     if DB_AVAILABLE is not None:
         return DB_AVAILABLE
     try:
         import importlib
         database_module = importlib.import_module('database')
-        DB_manage = database_module.DatabaseManager
+        DB_manage = database_module.get_database_manager
+        DB_writer = database_module.ResultWriter
         DB_AVAILABLE = True
         return True
     except Exception as e:
@@ -32,12 +53,211 @@ def import_database():
         print("Игра будет работать без сохранения результатов в БД.")
         DB_AVAILABLE = False
         DB_manage = None
+        DB_writer = None
         return False
 
+
+class HintCache:
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self.items = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def get(self, key):
+        self.items.move_to_end(key)
+        return self.items[key]
+
+    def put(self, key, move):
+        self.items[key] = move
+        self.items.move_to_end(key)
+        while len(self.items) > self.capacity:
+            self.items.popitem(last=False)
+
+
+class HintWorker(QThread):
+    hint_ready = pyqtSignal(object, object)
+
+    def __init__(self, state, parent=None):
+        super().__init__(parent)
+        self.state = state
+
+    def run(self):
+        try:
+            move = solver.best_move(self.state)
+        except Exception as e:
+            print(f"Ошибка поиска подсказки: {e}")
+            move = None
+        self.hint_ready.emit(self.state, move)
+
+
+class DatabaseSignals(QObject):
+    database_ready = pyqtSignal(object)
+    result_saved = pyqtSignal(bool)
+    stats_loaded = pyqtSignal(object)
+    name_checked = pyqtSignal(str, object)
+
+
+class PerfOverlay(QLabel):
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.setFont(QFont('Courier New', 10))
+        self.setStyleSheet("background-color: rgba(0, 0, 0, 180); color: #00ff00; padding: 6px;")
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.hide()
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(1000)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+    def toggle(self):
+        if self.isVisible():
+            self.refresh_timer.stop()
+            self.hide()
+        else:
+            self.refresh()
+            self.show()
+            self.refresh_timer.start()
+
+    def refresh(self):
+        if perf.ENABLED:
+            self.setText(perf.report(limit=15))
+        else:
+            self.setText("Замеры выключены.\nЗапустите игру с SOLITAIRE_PERF=1")
+        self.adjustSize()
+        self.move(10, 10)
+        self.raise_()
+
+
+def format_game_time(secs):
+    if secs is None:
+        return "Неизвестно"
+    if isinstance(secs, (int, float, decimal.Decimal)):
+        try:
+            total_secs = int(secs)
+            minutes = total_secs // 60
+            seconds = total_secs % 60
+            return f"{minutes:02d}:{seconds:02d}"
+        except (ValueError, TypeError, decimal.InvalidOperation):
+            return "Ошибка"
+    return "Неизвестно"
+
+
+class ResultsDialog(QDialog):
+    page_loaded = pyqtSignal(int, object)
+
+    PAGE_SIZE = 50
+    DIFFICULTIES = [("Все", None), ("Легкий", "easy"), ("Нормальный", "medium"), ("Сложный", "hard")]
+    OUTCOMES = [("Все", None), ("Победы", True), ("Поражения", False)]
+
+    def __init__(self, writer, parent=None):
+        super().__init__(parent)
+        self.writer = writer
+        self.request_id = 0
+        self.loading = False
+        self.has_more = True
+        self.last_row = None
+        self.page_loaded.connect(self.on_page_loaded)
+
+        self.setWindowTitle("Результаты игр")
+        self.setMinimumWidth(900)
+        self.setMinimumHeight(600)
+
+        layout = QVBoxLayout(self)
+
+        filters_layout = QHBoxLayout()
+        self.difficulty_combo = QComboBox()
+        self.difficulty_combo.addItems([name for name, _ in self.DIFFICULTIES])
+        self.difficulty_combo.currentIndexChanged.connect(self.reload)
+        filters_layout.addWidget(QLabel("Сложность:"))
+        filters_layout.addWidget(self.difficulty_combo)
+        self.outcome_combo = QComboBox()
+        self.outcome_combo.addItems([name for name, _ in self.OUTCOMES])
+        self.outcome_combo.currentIndexChanged.connect(self.reload)
+        filters_layout.addWidget(QLabel("Исход:"))
+        filters_layout.addWidget(self.outcome_combo)
+        filters_layout.addStretch()
+        layout.addLayout(filters_layout)
+
+        self.table = QTableWidget(0, 7)
+        self.table.setHorizontalHeaderLabels(
+            ["Место", "Игрок", "Время", "Победа", "Сложность", "Очки", "Подсказки осталось"]
+        )
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        self.table.verticalScrollBar().valueChanged.connect(self.on_scroll)
+        layout.addWidget(self.table)
+
+        self.more_button = QPushButton("Показать ещё")
+        self.more_button.clicked.connect(self.load_page)
+        layout.addWidget(self.more_button)
+
+        self.load_page()
+
+    def reload(self):
+        self.request_id += 1
+        self.loading = False
+        self.has_more = True
+        self.last_row = None
+        self.table.setRowCount(0)
+        self.load_page()
+
+    def on_scroll(self, value):
+        if value == self.table.verticalScrollBar().maximum():
+            self.load_page()
+
+    def load_page(self):
+        if self.loading or not self.has_more:
+            return
+        self.loading = True
+        self.more_button.setEnabled(False)
+        request_id = self.request_id
+        self.writer.get_leaderboard(
+            self.PAGE_SIZE,
+            self.last_row,
+            self.DIFFICULTIES[self.difficulty_combo.currentIndex()][1],
+            self.OUTCOMES[self.outcome_combo.currentIndex()][1],
+            callback=lambda rows: self.page_loaded.emit(request_id, rows)
+        )
+
+    def on_page_loaded(self, request_id, rows):
+        if request_id != self.request_id:
+            # Страница для старых фильтров
+            return
+        self.loading = False
+        self.has_more = len(rows) == self.PAGE_SIZE
+        self.more_button.setEnabled(self.has_more)
+
+        if not rows and self.table.rowCount() == 0:
+            self.more_button.setText("Пока нет сохранённых игр.")
+            return
+        self.more_button.setText("Показать ещё")
+
+        for row in rows:
+            _, name, secs, won, diff, score, hints = row
+            values = [
+                str(self.table.rowCount() + 1),
+                str(name),
+                format_game_time(secs),
+                "Да" if won else "Нет",
+                {"easy": "Легкий", "medium": "Нормальный", "hard": "Сложный"}.get(diff or "medium", "Нормальный"),
+                str(score if score is not None else 0),
+                "∞" if hints == -1 else (str(hints) if hints is not None else "-"),
+            ]
+            position = self.table.rowCount()
+            self.table.insertRow(position)
+            for column, value in enumerate(values):
+                self.table.setItem(position, column, QTableWidgetItem(value))
+        if rows:
+            self.last_row = rows[-1]
+
+
 class NameInputWidget(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.parent_app = parent
+        self.pending_name = None
         self.init_ui()
 
     def init_ui(self):
@@ -118,26 +338,47 @@ class NameInputWidget(QWidget):
         """)
         start_button.clicked.connect(self.start_game)
         layout.addWidget(start_button, alignment=Qt.AlignCenter)
+        self.start_button = start_button
+        # Пока база не ответила, имя не с чем сверить: игрок мог бы занять чужое имя
+        self.set_database_ready(self.parent_app.database_checked if self.parent_app else True)
 
         self.setLayout(layout)
         self.name_input.setFocus()
 
+    def set_database_ready(self, ready):
+        self.start_button.setEnabled(ready)
+        self.start_button.setText("Начать игру" if ready else "Подключение к базе…")
+
     def start_game(self):
         name = self.name_input.text().strip()
         if not name:
             QMessageBox.warning(self, "Внимание", "Пожалуйста, введите ваше имя!")
             return
 
-        if import_database() and DB_manage:
-            try:
-                db = DB_manage()
-                db.init_database()
-                if db.player_name_exists(name):
-                    QMessageBox.warning(self, "Ошибка", "Игрок с таким именем уже существует!")
-                    return
-            except Exception as e:
-                print(f"Предупреждение: не удалось проверить имя в БД: {e}")
+        writer = self.parent_app.result_writer if self.parent_app else None
+        if not writer:
+            self.launch(name)
+            return
 
+        # Ответ придет сигналом из потока записи; до него повторно начать игру нельзя
+        self.pending_name = name
+        self.start_button.setEnabled(False)
+        signals = self.parent_app.db_signals
+        writer.player_name_exists(name, callback=lambda exists: signals.name_checked.emit(name, exists))
+
+    def on_name_checked(self, name, exists):
+        if name != self.pending_name:
+            return
+        self.pending_name = None
+        self.start_button.setEnabled(True)
+        if exists:
+            QMessageBox.warning(self, "Ошибка", "Игрок с таким именем уже существует!")
+            return
+        if exists is None:
+            print("Предупреждение: не удалось проверить имя в БД")
+        self.launch(name)
+
+    def launch(self, name):
         mode = self.mode_combo.currentText()
         mode_map = {"Легкий": "easy", "Нормальный": "medium", "Сложный": "hard"}
         difficulty = mode_map[mode]
@@ -154,13 +395,16 @@ class App(QMainWindow):
         self.setStyleSheet("background-color: #483D8B;")
 
         self.db = None
-        if import_database() and DB_manage:
-            try:
-                self.db = DB_manage()
-                self.db.init_database()
-            except Exception as e:
-                print(f"Не удалось инициализировать базу данных: {e}")
-                self.db = None
+        self.result_writer = None
+        self.database_checked = False
+        self.db_signals = DatabaseSignals()
+        self.db_signals.result_saved.connect(self.on_result_saved)
+        self.db_signals.stats_loaded.connect(self.display_stats)
+        self.db_signals.database_ready.connect(self.on_database_ready)
+        self.db_signals.name_checked.connect(self.on_name_checked)
+        self.closing = False
+        # Подключение и проверка схемы идут в фоне, окно с вводом имени показывается сразу
+        threading.Thread(target=self.bootstrap_database, name='db-bootstrap', daemon=True).start()
 
         self.player_name = ""
         self.difficulty = "medium"
@@ -177,9 +421,78 @@ class App(QMainWindow):
         self.timer = QTimer()
         self.timer.timeout.connect(self.update_timer)
 
+        self.hint_cache = HintCache()
+        self.hint_worker = None
+        self.hint_requested = None
+        self.hint_idle_timer = QTimer()
+        self.hint_idle_timer.setSingleShot(True)
+        self.hint_idle_timer.setInterval(1500)
+        self.hint_idle_timer.timeout.connect(self.precompute_hint)
+
+        self.board_widget = None
+        self.win_pending = False
+        self.render_timer = QTimer()
+        self.render_timer.setSingleShot(True)
+        self.render_timer.setInterval(0)
+        self.render_timer.timeout.connect(self.flush_render)
+        # Доигрывание показывается по одной карте: ход в модели, перерисовка — тем же отложенным проходом
+        self.autoplay_timer = QTimer()
+        self.autoplay_timer.setInterval(AUTOPLAY_INTERVAL)
+        self.autoplay_timer.timeout.connect(self.autoplay_step)
+
+        QShortcut(QKeySequence.Undo, self, activated=self.undo_move)
+        QShortcut(QKeySequence.Redo, self, activated=self.redo_move)
+        QShortcut(QKeySequence('Ctrl+Y'), self, activated=self.redo_move)
+
+        self.perf_overlay = PerfOverlay(self)
+        QShortcut(QKeySequence('F3'), self, activated=self.perf_overlay.toggle)
+
+        self.deal_pool = DealPool()
+        self.deal_pool.start()
+
         self.form_for_name()
 
+    def bootstrap_database(self):
+        db = None
+        if import_database() and DB_manage:
+            try:
+                db = DB_manage()
+                with perf.section('ui.startup.init_database'):
+                    db.init_database()
+            except Exception as e:
+                print(f"Не удалось инициализировать базу данных: {e}")
+                db = None
+        self.db_signals.database_ready.emit(db)
+        if db:
+            db.load_name_cache()
+
+    def on_database_ready(self, db):
+        if self.closing:
+            if db:
+                db.close()
+            return
+        if db:
+            self.db = db
+            self.result_writer = DB_writer(db)
+        else:
+            self.statusBar().showMessage("База данных недоступна — результаты не будут сохраняться.", 5000)
+        # Без базы проверка имени пропускается, с базой идет через поток записи
+        self.database_checked = True
+        if self.board_widget is None:
+            self.name_widget.set_database_ready(True)
+
+    def on_name_checked(self, name, exists):
+        if self.board_widget is None:
+            self.name_widget.on_name_checked(name, exists)
+
+    def report_first_frame(self):
+        elapsed = time.perf_counter() - STARTED
+        perf.record('ui.startup.first_frame', elapsed)
+        print(f"Первый кадр через {elapsed * 1000:.0f} мс")
+
     def form_for_name(self):
+        self.autoplay_timer.stop()
+        self.board_widget = None
         self.name_widget = NameInputWidget(self)
         self.setCentralWidget(self.name_widget)
 
@@ -196,10 +509,11 @@ class App(QMainWindow):
 
         self.hints_remaining = self.strategy.get_initial_hints()
 
-        self.game = Game_Solitaire()
+        self.game = self.strategy.create_game(self.deal_pool)
         self.start_time = time.time()
         self.timer_running = True
         self.result_saved = False
+        self.replay_saved = False
 
         colors = {
             'зеленый': '#6B8E23',
@@ -210,10 +524,13 @@ class App(QMainWindow):
         self.bg_color = colors[color_name]
         print(f"Выбран цвет фона: {color_name}")
 
+        self.win_pending = False
         self.board()
+        self.hint_idle_timer.start()
         self.timer.start(1000)
         self.timer_label.setText("Время: 00:00")
 
+    @perf.timed('ui.board')
     def board(self):
         self.setStyleSheet(f"background-color: {self.bg_color};")
 
@@ -241,98 +558,10 @@ class App(QMainWindow):
 
         main_layout.addLayout(top_layout)
 
-        game_layout = QHBoxLayout()
-
-        left_panel = QVBoxLayout()
-        left_panel.setSpacing(10)
-
-        deck_label = QLabel("Колода")
-        deck_label.setFont(QFont('Arial', 24))
-        deck_label.setAlignment(Qt.AlignCenter)
-        deck_label.setStyleSheet("color: white;")
-        left_panel.addWidget(deck_label)
-
-        self.deck_button = QPushButton(f"({len(self.game.deck)} карт)")
-        self.deck_button.setFont(QFont('Arial', 24, QFont.Bold))
-        self.deck_button.setMinimumSize(120, 100)
-        self.deck_button.setStyleSheet("""
-            QPushButton { background-color: #1a237e; color: white; border-radius: 5px; }
-            QPushButton:hover { background-color: #283593; }
-        """)
-        self.deck_button.clicked.connect(self.draw_card)
-        left_panel.addWidget(self.deck_button)
-
-        waste_label = QLabel("Сброс")
-        waste_label.setFont(QFont('Arial', 24))
-        waste_label.setAlignment(Qt.AlignCenter)
-        waste_label.setStyleSheet("color: white;")
-        left_panel.addWidget(waste_label)
-
-        self.waste_button = QPushButton("Пусто")
-        self.waste_button.setFont(QFont('Arial', 24, QFont.Bold))
-        self.waste_button.setMinimumSize(120, 100)
-        self.waste_button.setStyleSheet("""
-            QPushButton { background-color: #4a148c; color: white; border-radius: 5px; }
-            QPushButton:hover { background-color: #6a1b9a; }
-        """)
-        self.waste_button.clicked.connect(self.use_waste_card)
-        left_panel.addWidget(self.waste_button)
-
-        left_panel.addStretch()
-        game_layout.addLayout(left_panel)
-
-        foundations_layout = QVBoxLayout()
-
-        foundation_label = QLabel("Фундаменты")
-        foundation_label.setFont(QFont('Arial', 24))
-        foundation_label.setAlignment(Qt.AlignCenter)
-        foundation_label.setStyleSheet("color: white;")
-        foundations_layout.addWidget(foundation_label)
-
-        foundations_grid = QGridLayout()
-        suits = ['♠', '♥', '♦', '♣']
-        self.foundation_buttons = []
-        for i, suit in enumerate(suits):
-            btn = QPushButton(f"{suit}\nПусто")
-            btn.setFont(QFont('Arial', 24, QFont.Bold))
-            btn.setMinimumSize(100, 100)
-            btn.setStyleSheet("""
-                QPushButton { background-color: #8B008B; color: white; border-radius: 5px; }
-                QPushButton:hover { background-color: #00897b; }
-            """)
-            btn.clicked.connect(lambda checked, idx=i: self.move_to_foundation(idx))
-            foundations_grid.addWidget(btn, 0, i)
-            self.foundation_buttons.append(btn)
-
-        foundations_layout.addLayout(foundations_grid)
-        foundations_layout.addStretch()
-        game_layout.addLayout(foundations_layout)
-
-        tableau_container = QWidget()
-        tableau_layout = QVBoxLayout(tableau_container)
-
-        tableau_label = QLabel("Игровые стопки")
-        tableau_label.setFont(QFont('Arial', 24))
-        tableau_label.setAlignment(Qt.AlignCenter)
-        tableau_label.setStyleSheet("color: white;")
-        tableau_layout.addWidget(tableau_label)
-
-        self.tableau_widget = QWidget()
-        self.tableau_grid = QGridLayout(self.tableau_widget)
-        self.tableau_grid.setSpacing(2)
-        self.tableau_buttons = [[] for _ in range(7)]
-
-        for i in range(7):
-            col_label = QLabel(f"Стопка {i+1}")
-            col_label.setFont(QFont('Arial', 24))
-            col_label.setAlignment(Qt.AlignCenter)
-            col_label.setStyleSheet("color: white;")
-            self.tableau_grid.addWidget(col_label, 0, i)
-
-        tableau_layout.addWidget(self.tableau_widget)
+        self.board_widget = BoardWidget(self)
 
         scroll_area = QScrollArea()
-        scroll_area.setWidget(tableau_container)
+        scroll_area.setWidget(self.board_widget)
         scroll_area.setWidgetResizable(True)
         scroll_area.setVerticalScrollBarPolicy(Qt.ScrollBarAsNeeded)
         scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarAsNeeded)
@@ -345,11 +574,7 @@ class App(QMainWindow):
             QScrollBar::handle:horizontal { background-color: rgba(255,255,255,150); border-radius: 6px; min-width: 20px; }
             QScrollBar::handle:horizontal:hover { background-color: rgba(255,255,255,200); }
         """)
-        scroll_area.setMaximumHeight(500)
-        scroll_area.setMinimumHeight(300)
-        game_layout.addWidget(scroll_area)
-
-        main_layout.addLayout(game_layout)
+        main_layout.addWidget(scroll_area, 1)
 
         buttons_layout = QHBoxLayout()
         buttons_layout.setSpacing(10)
@@ -364,6 +589,26 @@ class App(QMainWindow):
         hint_button.clicked.connect(self.use_hint)
         buttons_layout.addWidget(hint_button)
 
+        undo_button = QPushButton("Отменить")
+        undo_button.setFont(QFont('Arial', 24))
+        undo_button.setMinimumHeight(40)
+        undo_button.setStyleSheet("""
+            QPushButton { background-color: #9370DB; color: white; border-radius: 5px; }
+            QPushButton:hover { background-color: #9370DB; }
+        """)
+        undo_button.clicked.connect(self.undo_move)
+        buttons_layout.addWidget(undo_button)
+
+        redo_button = QPushButton("Вернуть")
+        redo_button.setFont(QFont('Arial', 24))
+        redo_button.setMinimumHeight(40)
+        redo_button.setStyleSheet("""
+            QPushButton { background-color: #9370DB; color: white; border-radius: 5px; }
+            QPushButton:hover { background-color: #9370DB; }
+        """)
+        redo_button.clicked.connect(self.redo_move)
+        buttons_layout.addWidget(redo_button)
+
         results_button = QPushButton("Результаты")
         results_button.setFont(QFont('Arial', 24))
         results_button.setMinimumHeight(40)
@@ -374,6 +619,16 @@ class App(QMainWindow):
         results_button.clicked.connect(self.show_results)
         buttons_layout.addWidget(results_button)
 
+        stats_button = QPushButton("Статистика")
+        stats_button.setFont(QFont('Arial', 24))
+        stats_button.setMinimumHeight(40)
+        stats_button.setStyleSheet("""
+            QPushButton { background-color: #800080; color: white; border-radius: 5px; }
+            QPushButton:hover { background-color: #800080; }
+        """)
+        stats_button.clicked.connect(self.show_stats)
+        buttons_layout.addWidget(stats_button)
+
         new_game_button = QPushButton("Новая игра")
         new_game_button.setFont(QFont('Arial', 24))
         new_game_button.setMinimumHeight(40)
@@ -398,6 +653,7 @@ class App(QMainWindow):
 
         central_widget.setLayout(main_layout)
         self.setCentralWidget(central_widget)
+        self.perf_overlay.raise_()
         self.draw_game()
 
     def get_difficulty_name(self):
@@ -418,170 +674,219 @@ class App(QMainWindow):
             QMessageBox.information(self, "Подсказки", "У вас закончились подсказки!")
             return
 
-        QMessageBox.information(self, "Подсказка", "Попробуйте переместить карты из сброса на игровое поле или фундаменты.")
+        key = self.position_key()
+        if key in self.hint_cache:
+            perf.count('ui.hint_cache.hit')
+            self.show_hint(self.hint_cache.get(key))
+            return
+
+        perf.count('ui.hint_cache.miss')
+        self.hint_requested = key
+        self.start_hint_search(key)
 
+    def precompute_hint(self):
+        if not self.game or not self.timer_running or not self.strategy.is_hints_allowed():
+            return
+        key = self.position_key()
+        if key not in self.hint_cache:
+            self.start_hint_search(key)
+
+    def position_key(self):
+        # Подсказка называет конкретные стопки и фундаменты, поэтому ключ — точная позиция,
+        # а не хеш Zobrist, для которого переставленные стопки совпадают
+        return self.game.pack()
+
+    def start_hint_search(self, key):
+        if self.hint_worker and self.hint_worker.isRunning():
+            # Результат текущего поиска сам запустит следующий, если позиция сменилась
+            return
+        worker = HintWorker(key, self)
+        worker.hint_ready.connect(self.on_hint_ready)
+        worker.finished.connect(lambda: self.on_hint_finished(worker))
+        worker.finished.connect(worker.deleteLater)
+        self.hint_worker = worker
+        worker.start()
+
+    def on_hint_finished(self, worker):
+        # Отработавший поток удаляется; если позиция успела смениться, поиск продолжается для новой
+        if self.hint_worker is not worker:
+            return
+        self.hint_worker = None
+        if self.game and self.timer_running and self.strategy.is_hints_allowed():
+            key = self.position_key()
+            if key not in self.hint_cache:
+                self.start_hint_search(key)
+
+    def on_hint_ready(self, key, move):
+        self.hint_cache.put(key, move)
+        if not self.game:
+            return
+
+        current = self.position_key()
+        if self.hint_requested != current:
+            # Игрок успел сходить — старый запрос больше не актуален
+            self.hint_requested = None
+        if current in self.hint_cache:
+            if self.hint_requested is not None:
+                self.hint_requested = None
+                self.show_hint(self.hint_cache.get(current))
+        elif self.timer_running:
+            self.start_hint_search(current)
+
+    def show_hint(self, move):
+        if move is None:
+            QMessageBox.information(self, "Подсказка", "Подходящих ходов не найдено.")
+            return
+
+        QMessageBox.information(self, "Подсказка", self.describe_move(move))
         self.hints_remaining = self.strategy.decrement_hints(self.hints_remaining)
         self.hints_label.setText(self.get_hints_text())
 
+    def describe_move(self, move):
+        kind = move[0]
+        if kind == DRAW:
+            return "Возьмите карту из колоды."
+        if kind == WASTE_TO_TABLEAU:
+            return f"Переложите {self.game.waste[-1]} из сброса в стопку {move[1] + 1}."
+        if kind == WASTE_TO_FOUNDATION:
+            return f"Переложите {self.game.waste[-1]} из сброса в фундамент."
+        if kind == TABLEAU_TO_TABLEAU:
+            card = self.game.tableau[move[1]][move[2]]
+            return f"Переложите {card} из стопки {move[1] + 1} в стопку {move[3] + 1}."
+        card = self.game.tableau[move[1]][-1]
+        return f"Переложите {card} из стопки {move[1] + 1} в фундамент."
+
     def show_results(self):
-        if not self.db:
+        if not self.result_writer:
             QMessageBox.information(self, "Результаты", "База данных недоступна — результаты не сохраняются.")
             return
 
-        try:
-            results = self.db.get_results(limit=20)
-        except Exception as e:
-            print(f"Ошибка загрузки результатов: {e}")
-            QMessageBox.warning(self, "Ошибка", "Не удалось загрузить результаты.")
-            return
+        dialog = ResultsDialog(self.result_writer, self)
+        dialog.exec_()
 
-        if not results:
-            QMessageBox.information(self, "Результаты", "Пока нет сохранённых игр.")
+    def show_stats(self):
+        if not self.result_writer:
+            QMessageBox.information(self, "Статистика", "База данных недоступна — статистика не ведется.")
             return
 
-        msg = "<table border='1' cellpadding='8' cellspacing='0' style='border-collapse: collapse; font-size: 14px; width: 100%;'>"
-        msg += "<tr style='background-color: #DA70D6; color: white; font-weight: bold;'><th>ID</th><th>Игрок</th><th>Время</th><th>Победа</th><th>Сложность</th><th>Очки</th><th>Подсказки осталось</th></tr>"
-
-        for row in results:
-            id_, name, secs, won, diff, score, hints = row
-
-            if secs is None:
-                time_str = "Неизвестно"
-            elif isinstance(secs, (int, float, decimal.Decimal)):
-                try:
-                    total_secs = int(secs)
-                    minutes = total_secs // 60
-                    seconds = total_secs % 60
-                    time_str = f"{minutes:02d}:{seconds:02d}"
-                except (ValueError, TypeError, decimal.InvalidOperation):
-                    time_str = "Ошибка"
-            else:
-                time_str = "Неизвестно"
-
-            won_str = "Да" if won else "Нет"
-            diff_str = {"easy": "Легкий", "medium": "Нормальный", "hard": "Сложный"}.get(diff or "medium", "Нормальный")
-            hints_str = "∞" if hints == -1 else (str(hints) if hints is not None else "-")
-            score_display = score if score is not None else 0
+        self.result_writer.get_stats(self.player_name, callback=self.db_signals.stats_loaded.emit)
 
-            bg = "#f9f9f9" if id_ % 2 == 0 else "#ffffff"
-            msg += f"<tr style='background-color: {bg};'><td>{id_}</td><td>{name}</td><td>{time_str}</td><td>{won_str}</td>"
-            msg += f"<td>{diff_str}</td><td>{score_display}</td><td>{hints_str}</td></tr>"
+    def display_stats(self, stats):
+        if stats is None:
+            QMessageBox.warning(self, "Ошибка", "Не удалось загрузить статистику.")
+            return
+        if not stats['difficulties']:
+            QMessageBox.information(self, "Статистика", "Пока нет сохранённых игр.")
+            return
 
+        names = {"easy": "Легкий", "medium": "Нормальный", "hard": "Сложный"}
+        table = "<table border='1' cellpadding='8' cellspacing='0' style='border-collapse: collapse; font-size: 14px; width: 100%;'>"
+        header = "<tr style='background-color: #DA70D6; color: white; font-weight: bold;'>"
+
+        msg = "<b>По режимам</b>" + table + header
+        msg += "<th>Сложность</th><th>Игр</th><th>Побед</th><th>Процент побед</th><th>Средние очки</th><th>Рекорд</th><th>Лучшее время</th></tr>"
+        for diff, games, wins, total_score, best_score, best_time in stats['difficulties']:
+            win_rate = f"{wins / games:.0%}" if games else "-"
+            average = f"{total_score / games:.0f}" if games else "-"
+            msg += f"<tr><td>{names.get(diff, diff)}</td><td>{games}</td><td>{wins}</td><td>{win_rate}</td>"
+            msg += f"<td>{average}</td><td>{best_score if best_score is not None else '-'}</td>"
+            msg += f"<td>{format_game_time(best_time) if best_time is not None else '-'}</td></tr>"
         msg += "</table>"
 
+        if stats['player']:
+            name, games, wins, total_score, best_score, best_time = stats['player']
+            msg += f"<p><b>Игрок {name}:</b> игр {games}, побед {wins}, очков {total_score}"
+            if best_time is not None:
+                msg += f", лучшее время {format_game_time(best_time)}"
+            msg += "</p>"
+
+        if stats['daily']:
+            msg += "<b>За последние дни</b>" + table + header
+            msg += "<th>День</th><th>Сложность</th><th>Игр</th><th>Побед</th><th>Очков</th></tr>"
+            for day, diff, games, wins, total_score in stats['daily']:
+                msg += f"<tr><td>{day:%d.%m.%Y}</td><td>{names.get(diff, diff)}</td>"
+                msg += f"<td>{games}</td><td>{wins}</td><td>{total_score}</td></tr>"
+            msg += "</table>"
+
         dialog = QMessageBox(self)
-        dialog.setText("Результаты игр")
+        dialog.setWindowTitle("Статистика")
+        dialog.setText("Статистика игр")
         dialog.setInformativeText(msg)
         dialog.setTextFormat(Qt.RichText)
         dialog.setMinimumWidth(900)
-        dialog.setMinimumHeight(600)
         dialog.exec_()
 
+    def schedule_draw(self):
+        # Сколько бы изменений ни пришло за один проход цикла событий, поле перерисуется один раз
+        perf.count('ui.draw_requests')
+        if not self.render_timer.isActive():
+            self.render_timer.start()
+
+    def flush_render(self):
+        if self.game and self.board_widget:
+            self.draw_game()
+
+    @perf.timed('ui.draw_game')
     def draw_game(self):
-        self.deck_button.setText(f"({len(self.game.deck)} карт)")
-
-        if self.game.waste:
-            waste_text = str(self.game.waste[-1])
-            is_selected = (self.selected_source and self.selected_source[0] == 'waste')
-            if is_selected:
-                self.waste_button.setStyleSheet("""
-                    QPushButton { background-color: #ffeb3b; color: black; border-radius: 5px; }
-                """)
-            else:
-                self.waste_button.setStyleSheet("""
-                    QPushButton { background-color: #4a148c; color: white; border-radius: 5px; }
-                    QPushButton:hover { background-color: #6a1b9a; }
-                """)
+        self.board_widget.sync()
+
+    def game_changed(self, autocomplete=True):
+        self.schedule_draw()
+        self.hint_idle_timer.start()
+        if autocomplete and self.timer_running and self.game.can_autocomplete():
+            self.start_autoplay()
+            return
+        if self.timer_running and not self.win_pending and self.check_win():
+            # Сообщение о победе показывается после перерисовки, в отдельном проходе цикла
+            self.win_pending = True
+            QTimer.singleShot(0, self.announce_win)
+
+    def start_autoplay(self):
+        if self.autoplay_timer.isActive():
+            return
+        self.clear_selection()
+        self.hint_idle_timer.stop()
+        self.autoplay_timer.start()
+
+    def autoplay_step(self):
+        if not self.game or not self.timer_running or self.board_widget is None:
+            self.autoplay_timer.stop()
+            return
+        move = self.game.next_foundation_move(safe_only=False)
+        if move is not None:
+            self.game.apply_move(move)
+        if move is None or not self.game.can_autocomplete():
+            self.autoplay_timer.stop()
+            self.game_changed(autocomplete=False)
         else:
-            waste_text = "Пусто"
-            self.waste_button.setStyleSheet("""
-                QPushButton { background-color: #4a148c; color: white; border-radius: 5px; }
-                QPushButton:hover { background-color: #6a1b9a; }
-            """)
-        self.waste_button.setText(waste_text)
-        self.waste_button.setFont(QFont('Arial', 24, QFont.Bold))
-
-        for i, foundation in enumerate(self.game.foundations):
-            if foundation:
-                text = f"{foundation[-1].suit}\n{foundation[-1].rank}"
-            else:
-                suits = ['♠', '♥', '♦', '♣']
-                text = f"{suits[i]}\nПусто"
-            self.foundation_buttons[i].setText(text)
-            self.foundation_buttons[i].setFont(QFont('Arial', 24, QFont.Bold))
-
-        for i in range(7):
-            for j in range(len(self.tableau_buttons[i])):
-                btn = self.tableau_buttons[i][j]
-                self.tableau_grid.removeWidget(btn)
-                btn.setParent(None)
-                btn.deleteLater()
-            self.tableau_buttons[i] = []
-
-        for i in range(7):
-            if not self.game.tableau[i]:
-                empty_btn = QPushButton("Пусто")
-                empty_btn.setFont(QFont('Arial', 24))
-                empty_btn.setMinimumSize(110, 70)
-                empty_btn.setMaximumSize(110, 70)
-                empty_btn.setStyleSheet("""
-                    QPushButton { background-color: #424242; color: white; border-radius: 3px; }
-                    QPushButton:hover { opacity: 0.8; }
-                """)
-                empty_btn.clicked.connect(lambda checked, col=i: self.try_move_card(col, None))
-                self.tableau_grid.addWidget(empty_btn, 1, i)
-                self.tableau_buttons[i].append(empty_btn)
-            else:
-                for j, card in enumerate(self.game.tableau[i]):
-                    is_selected = (self.selected_source and
-                                   self.selected_source[0] == 'tableau' and
-                                   self.selected_source[1] == i and
-                                   self.selected_source[2] == j)
-
-                    if card.face_up:
-                        card_text = f"{card.rank}{card.suit}"
-                        bg_color = '#ffeb3b' if is_selected else ('#ffffff' if card.color == 'red' else '#e0e0e0')
-                        fg_color = '#d32f2f' if card.color == 'red' else '#000000'
-                    else:
-                        card_text = "🃏"
-                        bg_color = '#ffeb3b' if is_selected else '#1a237e'
-                        fg_color = 'white'
-
-                    btn = QPushButton(card_text)
-                    btn.setFont(QFont('Arial', 24, QFont.Bold))
-                    btn.setMinimumSize(110, 70)
-                    btn.setMaximumSize(110, 70)
-                    btn.setStyleSheet(f"""
-                        QPushButton {{
-                            background-color: {bg_color};
-                            color: {fg_color};
-                            border-radius: 3px;
-                        }}
-                        QPushButton:hover {{ opacity: 0.8; }}
-                    """)
-                    btn.clicked.connect(lambda checked, col=i, idx=j: self.select_tableau_card(col, idx))
-                    self.tableau_grid.addWidget(btn, j + 1, i)
-                    self.tableau_buttons[i].append(btn)
-
-        if self.check_win():
+            self.schedule_draw()
+
+    def is_autoplaying(self):
+        return self.autoplay_timer.isActive()
+
+    def announce_win(self):
+        self.win_pending = False
+        if self.timer_running:
             self.end_game(True)
 
+    def tableau_clicked(self, column, index):
+        if not self.game.tableau[column]:
+            self.try_move_card(column, None)
+        else:
+            self.select_tableau_card(column, index)
+
     def draw_card(self):
-        if not self.game.deck:
-            self.game.deck = self.game.waste[::-1]
-            self.game.waste = []
-        if self.game.deck:
-            card = self.game.deck.pop()
-            card.face_up = True
-            self.game.waste.append(card)
-            self.draw_game()
+        if self.selected_source and self.selected_source[0] == 'waste':
+            self.clear_selection()
+        if self.game.apply_move((DRAW,)):
+            self.game_changed()
 
     def use_waste_card(self):
         if not self.game.waste:
             return
         self.selected_card = self.game.waste[-1]
         self.selected_source = ('waste', None)
-        self.draw_game()
+        self.schedule_draw()
 
     def select_tableau_card(self, column, index):
         if index < len(self.game.tableau[column]) and self.game.tableau[column][index].face_up:
@@ -590,104 +895,61 @@ class App(QMainWindow):
                         self.selected_source[1] == column and
                         self.selected_source[2] == index):
                     self.clear_selection()
-                    self.draw_game()
                 else:
                     self.try_move_card(column, index)
             else:
                 self.selected_card = self.game.tableau[column][index]
                 self.selected_source = ('tableau', column, index)
-                self.draw_game()
+                self.schedule_draw()
 
     def try_move_card(self, target_column, target_index=None):
         if not self.selected_card or not self.selected_source:
             return
 
-        card = self.selected_card
-        source_type = self.selected_source[0]
-        target_col = target_column
-
-        if not self.game.tableau[target_col]:
-            if card.rank == 'K':
-                if source_type == 'tableau':
-                    source_col = self.selected_source[1]
-                    source_idx = self.selected_source[2]
-                    cards_to_move = self.game.tableau[source_col][source_idx:]
-                    self.game.tableau[target_col].extend(cards_to_move)
-                    self.game.tableau[source_col] = self.game.tableau[source_col][:source_idx]
-                    if self.game.tableau[source_col] and not self.game.tableau[source_col][-1].face_up:
-                        self.game.tableau[source_col][-1].face_up = True
-                elif source_type == 'waste':
-                    self.game.waste.pop()
-                    self.game.tableau[target_col].append(card)
-                self.clear_selection()
-                self.draw_game()
-                return
+        if self.selected_source[0] == 'waste':
+            move = (WASTE_TO_TABLEAU, target_column)
         else:
-            top_card = self.game.tableau[target_col][-1]
-            if self.game.game_stopka(card, top_card):
-                if source_type == 'waste':
-                    self.game.waste.pop()
-                    self.game.tableau[target_col].append(card)
-                elif source_type == 'tableau':
-                    source_col = self.selected_source[1]
-                    source_idx = self.selected_source[2]
-                    cards_to_move = self.game.tableau[source_col][source_idx:]
-                    if all(c.face_up for c in cards_to_move):
-                        ranks = ['A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K']
-                        is_valid_sequence = True
-                        for k in range(len(cards_to_move) - 1):
-                            c1 = cards_to_move[k]
-                            c2 = cards_to_move[k + 1]
-                            if c1.color == c2.color:
-                                is_valid_sequence = False
-                                break
-                            idx1 = ranks.index(c1.rank)
-                            idx2 = ranks.index(c2.rank)
-                            if idx2 != idx1 - 1:
-                                is_valid_sequence = False
-                                break
-                        if is_valid_sequence:
-                            self.game.tableau[target_col].extend(cards_to_move)
-                            self.game.tableau[source_col] = self.game.tableau[source_col][:source_idx]
-                            if self.game.tableau[source_col] and not self.game.tableau[source_col][-1].face_up:
-                                self.game.tableau[source_col][-1].face_up = True
-                        else:
-                            self.game.tableau[target_col].append(cards_to_move[0])
-                            self.game.tableau[source_col] = self.game.tableau[source_col][:source_idx + 1]
-                            if self.game.tableau[source_col] and not self.game.tableau[source_col][-1].face_up:
-                                self.game.tableau[source_col][-1].face_up = True
-                    else:
-                        self.game.tableau[target_col].append(cards_to_move[0])
-                        self.game.tableau[source_col] = self.game.tableau[source_col][:source_idx + 1]
-                        if self.game.tableau[source_col] and not self.game.tableau[source_col][-1].face_up:
-                            self.game.tableau[source_col][-1].face_up = True
-                self.clear_selection()
-                self.draw_game()
-                return
+            move = (TABLEAU_TO_TABLEAU, self.selected_source[1], self.selected_source[2], target_column)
+        moved = self.game.apply_move(move)
 
         self.clear_selection()
-        self.draw_game()
+        if moved:
+            self.game_changed()
 
     def move_to_foundation(self, foundation_index):
         if not self.selected_card:
             return
-        card = self.selected_card
-        foundation = self.game.foundations[foundation_index]
-        if self.game.can_move_to_foundation(card, foundation):
-            source_type = self.selected_source[0]
-            if source_type == 'waste':
-                self.game.waste.pop()
-            elif source_type == 'tableau':
-                source_col = self.selected_source[1]
-                source_idx = self.selected_source[2]
-                self.game.tableau[source_col].pop(source_idx)
-                if self.game.tableau[source_col] and not self.game.tableau[source_col][-1].face_up:
-                    self.game.tableau[source_col][-1].face_up = True
-            foundation.append(card)
+
+        if self.selected_source[0] == 'waste':
+            move = (WASTE_TO_FOUNDATION, foundation_index)
+        else:
+            if self.selected_source[2] != len(self.game.tableau[self.selected_source[1]]) - 1:
+                return
+            move = (TABLEAU_TO_FOUNDATION, self.selected_source[1], foundation_index)
+        if self.game.apply_move(move):
             self.clear_selection()
-            self.draw_game()
+            self.game_changed()
+
+    def undo_move(self):
+        if not self.game or not self.timer_running:
+            return
+        # Отмена прерывает доигрывание и сама его заново не запускает
+        self.autoplay_timer.stop()
+        self.clear_selection()
+        if self.game.undo_move():
+            self.game_changed(autocomplete=False)
+
+    def redo_move(self):
+        if not self.game or not self.timer_running:
+            return
+        self.autoplay_timer.stop()
+        self.clear_selection()
+        if self.game.redo_move():
+            self.game_changed(autocomplete=False)
 
     def clear_selection(self):
+        if self.selected_source:
+            self.schedule_draw()
         self.selected_card = None
         self.selected_source = None
 
@@ -699,14 +961,12 @@ class App(QMainWindow):
             self.timer_label.setText(f"Время: {minutes:02d}:{seconds:02d}")
 
     def check_win(self):
-        for foundation in self.game.foundations:
-            if len(foundation) != 13:
-                return False
-        return True
+        return self.game.is_won()
 
     def end_game(self, won=False):
         self.timer_running = False
         self.timer.stop()
+        self.archive_replay()
 
         if won:
             elapsed = time.time() - self.start_time
@@ -717,22 +977,20 @@ class App(QMainWindow):
 
             final_score = max(0, base_score - time_penalty + hint_bonus)
 
-            saved = False
-            if self.db:
-                try:
-                    saved = self.db.save_result(
-                        self.player_name,
-                        total_seconds,
-                        True,
-                        self.difficulty,
-                        final_score,
-                        self.strategy.get_hints_for_db(self.hints_remaining)
-                    )
-                    self.result_saved = True
-                except Exception as e:
-                    print(f"Ошибка при сохранении результата: {e}")
-
-            save_message = "\nРезультат сохранен в базу данных." if saved else "\nРезультат не сохранен (БД недоступна)."
+            if self.result_writer:
+                self.result_writer.save_result(
+                    self.player_name,
+                    total_seconds,
+                    True,
+                    self.difficulty,
+                    final_score,
+                    self.strategy.get_hints_for_db(self.hints_remaining),
+                    callback=self.db_signals.result_saved.emit
+                )
+                self.result_saved = True
+                save_message = "\nРезультат сохраняется..."
+            else:
+                save_message = "\nРезультат не сохранен (БД недоступна)."
 
             msg = QMessageBox(self)
             msg.setWindowTitle("Поздравляем!")
@@ -761,25 +1019,54 @@ class App(QMainWindow):
         self.close()
 
     def closeEvent(self, event):
+        self.closing = True
         self.save_current_result_if_needed()
+        self.hint_idle_timer.stop()
+        self.autoplay_timer.stop()
+        self.deal_pool.stop()
+        if self.hint_worker and self.hint_worker.isRunning():
+            self.hint_worker.wait()
+        if self.result_writer:
+            self.result_writer.flush()
+            self.result_writer.stop()
+        if self.db:
+            self.db.close()
+        if perf.ENABLED:
+            perf.export()
         event.accept()
 
+    def archive_replay(self):
+        if not self.game or not self.game.history or self.replay_saved:
+            return
+        self.replay_saved = True
+        name = f"{time.strftime('%Y%m%d_%H%M%S')}_{self.difficulty}.klr"
+        try:
+            os.makedirs(REPLAY_DIR, exist_ok=True)
+            replay.save_replay(os.path.join(REPLAY_DIR, name), self.game)
+        except OSError as e:
+            print(f"Не удалось сохранить повтор партии: {e}")
+
     def save_current_result_if_needed(self):
         if self.game and self.start_time and not self.result_saved:
+            self.archive_replay()
             elapsed = time.time() - self.start_time
-            if self.db:
-                try:
-                    self.db.save_result(
-                        self.player_name,
-                        int(elapsed),
-                        False,
-                        self.difficulty,
-                        0,
-                        self.strategy.get_hints_for_db(self.hints_remaining) if self.strategy else -1
-                    )
-                    self.result_saved = True
-                except Exception as e:
-                    print(f"Ошибка при сохранении результата: {e}")
+            if self.result_writer:
+                self.result_writer.save_result(
+                    self.player_name,
+                    int(elapsed),
+                    False,
+                    self.difficulty,
+                    0,
+                    self.strategy.get_hints_for_db(self.hints_remaining) if self.strategy else -1,
+                    callback=self.db_signals.result_saved.emit
+                )
+                self.result_saved = True
+
+    def on_result_saved(self, saved):
+        if saved:
+            self.statusBar().showMessage("Результат сохранен в базу данных.", 5000)
+        else:
+            self.statusBar().showMessage("БД недоступна — результат сохранен локально и будет отправлен позже.", 5000)
 
     def reset_game(self):
         self.save_current_result_if_needed()
@@ -810,6 +1097,13 @@ class DifficultyStrategy:
     def get_hints_for_db(self, hints_remaining):
         raise NotImplementedError
 
+    def get_deal_difficulty(self):
+        raise NotImplementedError
+
+    def create_game(self, deal_pool=None):
+        game = deal_pool.take(self.get_deal_difficulty()) if deal_pool else None
+        return game if game else Game_Solitaire()
+
 
 class EasyStrategy(DifficultyStrategy):
     def get_initial_hints(self):
@@ -833,6 +1127,9 @@ class EasyStrategy(DifficultyStrategy):
     def get_hints_for_db(self, hints_remaining):
         return -1
 
+    def get_deal_difficulty(self):
+        return 'easy'
+
 
 class MediumStrategy(DifficultyStrategy):
     def get_initial_hints(self):
@@ -856,6 +1153,9 @@ class MediumStrategy(DifficultyStrategy):
     def get_hints_for_db(self, hints_remaining):
         return int(hints_remaining)
 
+    def get_deal_difficulty(self):
+        return 'medium'
+
 
 class HardStrategy(DifficultyStrategy):
     def get_initial_hints(self):
@@ -878,11 +1178,15 @@ class HardStrategy(DifficultyStrategy):
     def get_hints_for_db(self, hints_remaining):
         return 0
 
+    def get_deal_difficulty(self):
+        return 'hard'
+
 
 def main():
     app = QApplication(sys.argv)
     window = App()
     window.show()
+    QTimer.singleShot(0, window.report_first_frame)
     sys.exit(app.exec_())
 
 
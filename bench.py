@@ -0,0 +1,350 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from logic import Game_Solitaire, Card, SUITS, RANKS
+import simulate
+import solver
+
+BENCHMARKS = []
+
+
+def benchmark(group):
+    def register(func):
+        BENCHMARKS.append((group, func.__name__, func))
+        return func
+    return register
+
+
+def measure(func, ops, repeat, warmup=1):
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) / ops)
+    return {
+        'ops': ops,
+        'best': min(samples),
+        'median': statistics.median(samples),
+    }
+
+
+def recorded_games(count=30):
+    # Ходы жадной стратегии: одинаковые при каждом запуске, потому что зависят только от номера раздачи
+    games = []
+    for seed in range(count):
+        game = Game_Solitaire(seed)
+        rng = random.Random(seed)
+        for _ in range(300):
+            moves = game.legal_moves()
+            move = simulate.greedy_policy(game, moves, rng) if moves else None
+            if move is None:
+                break
+            game.apply_move(move)
+        games.append(game)
+    return games
+
+
+@benchmark('engine')
+def init_game():
+    seeds = range(200)
+
+    def run():
+        for seed in seeds:
+            Game_Solitaire(seed)
+    return run, len(seeds)
+
+
+@benchmark('engine')
+def can_move_to_foundation():
+    game = Game_Solitaire(0)
+    cards = [Card(suit, rank) for suit in SUITS for rank in RANKS]
+    foundations = [[]] + [[card] for card in cards]
+    pairs = [(card, foundation) for card in cards for foundation in foundations]
+    check = game.can_move_to_foundation
+
+    def run():
+        for card, foundation in pairs:
+            check(card, foundation)
+    return run, len(pairs)
+
+
+@benchmark('engine')
+def game_stopka():
+    game = Game_Solitaire(0)
+    cards = [Card(suit, rank) for suit in SUITS for rank in RANKS]
+    for card in cards:
+        card.face_up = True
+    pairs = [(card, target) for card in cards for target in cards]
+    check = game.game_stopka
+
+    def run():
+        for card, target in pairs:
+            check(card, target)
+    return run, len(pairs)
+
+
+@benchmark('engine')
+def legal_moves():
+    games = recorded_games()
+    positions = []
+    for game in games:
+        for _ in range(len(game.history) // 2):
+            game.undo_move()
+        positions.append((game, game.legal_moves()[0]))
+
+    def run():
+        # Список ходов кешируется до следующего хода, поэтому каждый замер идет после хода
+        # или отмены: считается пересчет ходов вместе с самим ходом
+        for game, move in positions:
+            game.apply_move(move)
+            game.legal_moves()
+            game.undo_move()
+            game.legal_moves()
+    return run, len(positions) * 2
+
+
+@benchmark('engine')
+def move_sequence():
+    games = recorded_games()
+    sequences = [(game, game.moves_played()) for game in games]
+    for game, moves in sequences:
+        while game.history:
+            game.undo_move()
+    ops = sum(len(moves) for _, moves in sequences) * 2
+
+    def run():
+        # Каждый ход применяется и отменяется, партия возвращается в начало
+        for game, moves in sequences:
+            for move in moves:
+                game.apply_move(move)
+            for _ in moves:
+                game.undo_move()
+    return run, ops
+
+
+@benchmark('engine')
+def solve():
+    seeds = range(5)
+    node_limit = 5000
+    nodes = sum(solver.solve(Game_Solitaire(seed), node_limit)['nodes'] for seed in seeds)
+
+    def run():
+        for seed in seeds:
+            solver.solve(Game_Solitaire(seed), node_limit)
+    return run, max(nodes, 1)
+
+
+def make_window():
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtWidgets import QApplication
+    import APP
+    from dealpool import DealPool
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    # Без базы данных и фонового решателя: измеряется только отрисовка, включая обработку событий Qt
+    APP.import_database = lambda: False
+    APP.DealPool = lambda: DealPool(bank_path=None, target=0)
+    window = APP.App()
+    window.start_game("bench", "medium")
+    window.timer.stop()
+    window.game = Game_Solitaire(0)
+    window.draw_game()
+    window.show()
+    app.processEvents()
+    return app, window
+
+
+@benchmark('ui')
+def draw_game_idle():
+    app, window = make_window()
+    count = 200
+
+    def run():
+        for _ in range(count):
+            window.draw_game()
+            app.processEvents()
+    return run, count
+
+
+@benchmark('ui')
+def draw_game_move():
+    app, window = make_window()
+    game = window.game
+    move = game.legal_moves()[0]
+    count = 100
+
+    def run():
+        for _ in range(count):
+            game.apply_move(move)
+            window.draw_game()
+            app.processEvents()
+            game.undo_move()
+            window.draw_game()
+            app.processEvents()
+    return run, count * 2
+
+
+@benchmark('ui')
+def draw_game_tall_column():
+    app, window = make_window()
+    column = window.game.tableau[0]
+    base = list(column)
+    extra = window.game.deck[:19]
+    for card in extra:
+        card.face_up = True
+
+    def run():
+        # Стопка растет до 20 карт, каждая карта — отдельная перерисовка
+        for card in extra:
+            column.append(card)
+            window.draw_game()
+            app.processEvents()
+        del column[len(base):]
+        window.draw_game()
+        app.processEvents()
+    return run, len(extra) + 1
+
+
+def make_backend():
+    import database
+    directory = tempfile.mkdtemp(prefix='solitaire-bench-')
+    db = database.SQLiteBackend(os.path.join(directory, 'bench.db'))
+    db.init_database()
+    rows = [(f"player{i}", 60 + i % 600, i % 3 != 0, ('easy', 'medium', 'hard')[i % 3], i % 1000, 5)
+            for i in range(2000)]
+    db.save_results(rows)
+    return db
+
+
+@benchmark('db')
+def save_result():
+    db = make_backend()
+    counter = iter(range(10 ** 9))
+    count = 100
+
+    def run():
+        for _ in range(count):
+            db.save_result(f"single{next(counter)}", 120, True, 'medium', 500, 3)
+    return run, count
+
+
+@benchmark('db')
+def save_results_batch():
+    db = make_backend()
+    counter = iter(range(10 ** 9))
+    count = 500
+
+    def run():
+        batch = next(counter)
+        db.save_results([(f"batch{batch}_{i}", 120, True, 'medium', i, 3) for i in range(count)])
+    return run, count
+
+
+@benchmark('db')
+def get_results():
+    db = make_backend()
+    count = 100
+
+    def run():
+        for _ in range(count):
+            db.get_results(10)
+    return run, count
+
+
+@benchmark('db')
+def get_leaderboard_pages():
+    db = make_backend()
+    pages = 20
+
+    def run():
+        after = None
+        for _ in range(pages):
+            rows = db.get_leaderboard(50, after)
+            after = rows[-1]
+    return run, pages
+
+
+def run_benchmarks(groups=None, repeat=5, names=None):
+    results = {}
+    for group, name, setup in BENCHMARKS:
+        if groups and group not in groups:
+            continue
+        if names and name not in names:
+            continue
+        try:
+            func, ops = setup()
+        except ImportError as e:
+            print(f"{group}.{name}: пропущен ({e})")
+            continue
+        results[f"{group}.{name}"] = measure(func, ops, repeat)
+    return results
+
+
+def format_time(seconds):
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.3f} мс"
+    return f"{seconds * 1e6:.3f} мкс"
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            print(f"{key:40} {format_time(result['best']):>14}  (нет в базовой линии)")
+            continue
+        before = baseline[key]['best']
+        change = result['best'] / before - 1 if before else 0.0
+        mark = ""
+        if change > threshold:
+            mark = "  ЗАМЕДЛЕНИЕ"
+            regressions.append(key)
+        elif change < -threshold:
+            mark = "  ускорение"
+        print(f"{key:40} {format_time(before):>14} -> {format_time(result['best']):>14} {change:+8.1%}{mark}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры производительности движка, отрисовки и базы данных")
+    parser.add_argument('--group', action='append', choices=['engine', 'ui', 'db'], help="группа замеров (можно несколько)")
+    parser.add_argument('--only', action='append', help="имя отдельного замера")
+    parser.add_argument('--repeat', type=int, default=5, help="повторов каждого замера")
+    parser.add_argument('--save', help="сохранить результаты как базовую линию (JSON)")
+    parser.add_argument('--compare', help="сравнить с сохраненной базовой линией")
+    parser.add_argument('--threshold', type=float, default=0.10, help="допустимое замедление, доля")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.group, args.repeat, args.only)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"Замедлились: {', '.join(regressions)}")
+            sys.exit(1)
+    else:
+        for key, result in results.items():
+            print(f"{key:40} {format_time(result['best']):>14}  медиана {format_time(result['median'])}")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'results': results,
+            }, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
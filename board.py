@@ -0,0 +1,277 @@
+from PyQt5.QtCore import Qt, QRect, QRectF
+from PyQt5.QtGui import QColor, QFont, QPainter, QPen, QPixmap
+from PyQt5.QtWidgets import QWidget
+
+import perf
+from logic import SUITS, RANKS, CARD_RED
+
+CARD_WIDTH = 100
+CARD_HEIGHT = 140
+GAP = 16
+MARGIN = 16
+LABEL_HEIGHT = 32
+# Сдвиг следующей карты в стопке: закрытые лежат плотнее открытых
+DOWN_OFFSET = 18
+UP_OFFSET = 34
+
+BOARD_WIDTH = 2 * MARGIN + 7 * CARD_WIDTH + 6 * GAP
+TOP_ROW_Y = MARGIN + LABEL_HEIGHT
+TABLEAU_LABEL_Y = TOP_ROW_Y + CARD_HEIGHT + GAP
+TABLEAU_Y = TABLEAU_LABEL_Y + LABEL_HEIGHT
+
+STOCK = 'stock'
+WASTE = 'waste'
+FOUNDATION = 'foundation'
+COLUMN = 'column'
+
+# Ячейки служебного ряда атласа под рубашкой и пустыми местами
+BACK = 0
+EMPTY_COLUMN = 1
+EMPTY_FOUNDATION = 2
+EMPTY_STOCK = 6
+EMPTY_WASTE = 7
+
+FACE_COLORS = {
+    False: ('#e0e0e0', '#000000'),
+    True: ('#ffffff', '#d32f2f'),
+}
+SELECTED_COLOR = '#ffeb3b'
+
+_atlases = {}
+
+
+class CardAtlas:
+    # Все изображения карт рисуются один раз в одну картинку, дальше только копируются
+    def __init__(self, ratio=1.0):
+        self.ratio = ratio
+        self.pixmap = QPixmap(int(13 * CARD_WIDTH * ratio), int(9 * CARD_HEIGHT * ratio))
+        self.pixmap.setDevicePixelRatio(ratio)
+        self.pixmap.fill(Qt.transparent)
+
+        painter = QPainter(self.pixmap)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setRenderHint(QPainter.TextAntialiasing)
+        self.corner_font = QFont('Arial', 16, QFont.Bold)
+        self.center_font = QFont('Arial', 40)
+        self.label_font = QFont('Arial', 14, QFont.Bold)
+        for code in range(52):
+            self.draw_face(painter, self.face_rect(code, False), code, False)
+            self.draw_face(painter, self.face_rect(code, True), code, True)
+        self.draw_back(painter, self.cell(BACK))
+        self.draw_empty(painter, self.cell(EMPTY_COLUMN), '#424242', "Пусто", self.label_font)
+        for i, suit in enumerate(SUITS):
+            self.draw_empty(painter, self.cell(EMPTY_FOUNDATION + i), '#8B008B', suit, self.center_font)
+        self.draw_empty(painter, self.cell(EMPTY_STOCK), '#1a237e', "↻", self.center_font)
+        self.draw_empty(painter, self.cell(EMPTY_WASTE), '#4a148c', "Пусто", self.label_font)
+        painter.end()
+
+    def face_rect(self, code, selected):
+        row = code // 13 + (4 if selected else 0)
+        return QRect(code % 13 * CARD_WIDTH, row * CARD_HEIGHT, CARD_WIDTH, CARD_HEIGHT)
+
+    def cell(self, index):
+        return QRect(index * CARD_WIDTH, 8 * CARD_HEIGHT, CARD_WIDTH, CARD_HEIGHT)
+
+    def source(self, rect):
+        ratio = self.ratio
+        return QRectF(rect.x() * ratio, rect.y() * ratio, rect.width() * ratio, rect.height() * ratio)
+
+    def card_shape(self, painter, rect, fill, border):
+        painter.setPen(QPen(QColor(border), 1.5))
+        painter.setBrush(QColor(fill))
+        painter.drawRoundedRect(QRectF(rect).adjusted(1, 1, -1, -1), 6, 6)
+
+    def draw_face(self, painter, rect, code, selected):
+        background, foreground = FACE_COLORS[CARD_RED[code]]
+        self.card_shape(painter, rect, SELECTED_COLOR if selected else background, '#333333')
+        painter.setPen(QColor(foreground))
+        suit = SUITS[code // 13]
+        painter.setFont(self.corner_font)
+        painter.drawText(rect.adjusted(8, 4, -8, -4), Qt.AlignLeft | Qt.AlignTop, f"{RANKS[code % 13]}{suit}")
+        painter.setFont(self.center_font)
+        painter.drawText(rect.adjusted(0, 20, 0, 0), Qt.AlignCenter, suit)
+
+    def draw_back(self, painter, rect):
+        self.card_shape(painter, rect, '#1a237e', '#0d1240')
+        painter.setPen(QPen(QColor('#3949ab'), 2))
+        painter.setBrush(Qt.NoBrush)
+        painter.drawRoundedRect(QRectF(rect).adjusted(8, 8, -8, -8), 4, 4)
+
+    def draw_empty(self, painter, rect, color, text, font):
+        self.card_shape(painter, rect, color, '#ffffff')
+        painter.setPen(QColor('white'))
+        painter.setFont(font)
+        painter.drawText(rect, Qt.AlignCenter, text)
+
+
+def card_atlas(ratio):
+    atlas = _atlases.get(ratio)
+    if atlas is None:
+        atlas = _atlases[ratio] = CardAtlas(ratio)
+    return atlas
+
+
+def column_offsets(view):
+    offsets = []
+    y = 0
+    for code, face_up, selected in view:
+        offsets.append(y)
+        y += UP_OFFSET if face_up else DOWN_OFFSET
+    return offsets
+
+
+class BoardWidget(QWidget):
+    def __init__(self, app, parent=None):
+        super().__init__(parent)
+        self.app = app
+        self.background = QColor(app.bg_color)
+        self.views = {}
+        self.label_font = QFont('Arial', 14, QFont.Bold)
+        self.count_font = QFont('Arial', 16, QFont.Bold)
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
+        self.setMinimumSize(BOARD_WIDTH, TABLEAU_Y + CARD_HEIGHT + MARGIN)
+
+    def origin(self):
+        # Поле центрируется по ширине, поэтому все координаты считаются от этого сдвига
+        return max(0, (self.width() - BOARD_WIDTH) // 2)
+
+    def column_x(self, index):
+        return self.origin() + MARGIN + index * (CARD_WIDTH + GAP)
+
+    def slot_position(self, key):
+        kind = key[0]
+        if kind == STOCK:
+            return self.column_x(0), TOP_ROW_Y
+        if kind == WASTE:
+            return self.column_x(1), TOP_ROW_Y
+        if kind == FOUNDATION:
+            return self.column_x(3 + key[1]), TOP_ROW_Y
+        return self.column_x(key[1]), TABLEAU_Y
+
+    def slot_rect(self, key, view):
+        x, y = self.slot_position(key)
+        height = CARD_HEIGHT
+        if key[0] == COLUMN and view:
+            height += column_offsets(view)[-1]
+        return QRect(x, y, CARD_WIDTH, height)
+
+    def current_views(self):
+        game = self.app.game
+        source = self.app.selected_source
+        views = {
+            (STOCK,): len(game.deck),
+            (WASTE,): (game.waste[-1].code if game.waste else None,
+                       bool(source and source[0] == 'waste')),
+        }
+        for i, foundation in enumerate(game.foundations):
+            views[(FOUNDATION, i)] = foundation[-1].code if foundation else None
+        for i, column in enumerate(game.tableau):
+            selected = source[2] if source and source[0] == 'tableau' and source[1] == i else None
+            views[(COLUMN, i)] = tuple((card.code, card.face_up, j == selected) for j, card in enumerate(column))
+        return views
+
+    def sync(self):
+        # Перерисовываются только ячейки, чье содержимое поменялось
+        views = self.current_views()
+        height = max(self.slot_rect(key, view).bottom() for key, view in views.items()) + MARGIN
+        if height != self.minimumHeight():
+            self.setMinimumHeight(height)
+        for key, view in views.items():
+            old = self.views.get(key)
+            if old == view:
+                continue
+            rect = self.slot_rect(key, view)
+            if old is not None:
+                rect = rect.united(self.slot_rect(key, old))
+            self.update(rect)
+        self.views = views
+
+    @perf.timed('ui.board_paint')
+    def paintEvent(self, event):
+        region = event.rect()
+        painter = QPainter(self)
+        painter.fillRect(region, self.background)
+        atlas = card_atlas(self.devicePixelRatioF())
+
+        painter.setPen(QColor('white'))
+        painter.setFont(self.label_font)
+        labels = [(0, 1, TOP_ROW_Y, "Колода"), (1, 1, TOP_ROW_Y, "Сброс"), (3, 4, TOP_ROW_Y, "Фундаменты")]
+        labels += [(i, 1, TABLEAU_Y, f"Стопка {i + 1}") for i in range(7)]
+        for column, span, y, text in labels:
+            rect = QRect(self.column_x(column), y - LABEL_HEIGHT, span * CARD_WIDTH + (span - 1) * GAP, LABEL_HEIGHT)
+            if rect.intersects(region):
+                painter.drawText(rect, Qt.AlignCenter, text)
+
+        for key, view in self.views.items():
+            rect = self.slot_rect(key, view)
+            if not rect.intersects(region):
+                continue
+            kind = key[0]
+            x, y = rect.x(), rect.y()
+            if kind == STOCK:
+                self.draw_cell(painter, atlas, x, y, BACK if view else EMPTY_STOCK)
+                if view:
+                    painter.setPen(QColor('white'))
+                    painter.setFont(self.count_font)
+                    painter.drawText(rect, Qt.AlignCenter, str(view))
+            elif kind == WASTE:
+                code, selected = view
+                if code is None:
+                    self.draw_cell(painter, atlas, x, y, EMPTY_WASTE)
+                else:
+                    self.draw_card(painter, atlas, x, y, code, selected)
+            elif kind == FOUNDATION:
+                if view is None:
+                    self.draw_cell(painter, atlas, x, y, EMPTY_FOUNDATION + key[1])
+                else:
+                    self.draw_card(painter, atlas, x, y, view, False)
+            elif not view:
+                self.draw_cell(painter, atlas, x, y, EMPTY_COLUMN)
+            else:
+                for (code, face_up, selected), offset in zip(view, column_offsets(view)):
+                    if face_up:
+                        self.draw_card(painter, atlas, x, y + offset, code, selected)
+                    else:
+                        self.draw_cell(painter, atlas, x, y + offset, BACK)
+        painter.end()
+
+    def draw_card(self, painter, atlas, x, y, code, selected):
+        target = QRectF(x, y, CARD_WIDTH, CARD_HEIGHT)
+        painter.drawPixmap(target, atlas.pixmap, atlas.source(atlas.face_rect(code, selected)))
+
+    def draw_cell(self, painter, atlas, x, y, index):
+        target = QRectF(x, y, CARD_WIDTH, CARD_HEIGHT)
+        painter.drawPixmap(target, atlas.pixmap, atlas.source(atlas.cell(index)))
+
+    def hit_test(self, point):
+        for key, view in self.views.items():
+            rect = self.slot_rect(key, view)
+            if not rect.contains(point):
+                continue
+            if key[0] != COLUMN:
+                return key, None
+            if not view:
+                return key, 0
+            y = point.y() - rect.y()
+            offsets = column_offsets(view)
+            # Верхние карты перекрывают нижние, поэтому проверяем с конца стопки
+            for index in range(len(view) - 1, -1, -1):
+                if offsets[index] <= y < offsets[index] + CARD_HEIGHT:
+                    return key, index
+        return None, None
+
+    def mousePressEvent(self, event):
+        if event.button() != Qt.LeftButton or self.app.is_autoplaying():
+            return
+        key, index = self.hit_test(event.pos())
+        if key is None:
+            return
+        kind = key[0]
+        if kind == STOCK:
+            self.app.draw_card()
+        elif kind == WASTE:
+            self.app.use_waste_card()
+        elif kind == FOUNDATION:
+            self.app.move_to_foundation(key[1])
+        else:
+            self.app.tableau_clicked(key[1], index)
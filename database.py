@@ -1,111 +1,1122 @@
-try:
-    import psycopg2
-    PSYCOPG2_AVAILABLE = True
-except ImportError as e:
-    PSYCOPG2_AVAILABLE = False
-    print(f"psycopg2 недоступен: {e}")
-
-class DatabaseManager:
+import datetime
+import hashlib
+import importlib.util
+import json
+import math
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import perf
+
+# psycopg2 загружается при первом подключении: проверка наличия модуля его не импортирует
+psycopg2 = None
+PSYCOPG2_AVAILABLE = importlib.util.find_spec('psycopg2') is not None
+if not PSYCOPG2_AVAILABLE:
+    print("psycopg2 недоступен: модуль не установлен")
+
+
+def load_psycopg2():
+    global psycopg2
+    if psycopg2 is None:
+        import psycopg2.extras
+        import psycopg2.pool
+    return psycopg2
+
+# Порядок таблицы рекордов: больше очков, затем меньше время, затем id.
+# Выражения совпадают с индексами, поэтому следующая страница — диапазон по индексу
+LEADERBOARD_KEY = "-COALESCE(score, 0), COALESCE(game_time_seconds, 2147483647), id"
+# SQLite не ищет по индексу сравнение кортежей из выражений и просматривает его с начала,
+# поэтому условие расписано по столбцам, а первое сравнение задает начало диапазона
+SQLITE_LEADERBOARD_AFTER = (
+    "-COALESCE(score, 0) >= ? AND (-COALESCE(score, 0) > ? "
+    "OR COALESCE(game_time_seconds, 2147483647) > ? "
+    "OR (COALESCE(game_time_seconds, 2147483647) = ? AND id > ?))"
+)
+
+
+def leaderboard_key(row):
+    id_, _, secs, _, _, score, _ = row
+    return (-(score or 0), secs if secs is not None else 2147483647, id_)
+
+
+def result_row(player_name, game_time_seconds, won, difficulty="medium", score=0, hints_remaining=-1,
+               played_at=None):
+    # Время партии фиксируется при сохранении: отложенная запись должна попасть в сводку своего дня.
+    # В файле отложенных результатов оно хранится строкой ISO, в старых строках его нет
+    if played_at is None:
+        played_at = datetime.datetime.now(datetime.timezone.utc)
+    elif isinstance(played_at, str):
+        played_at = datetime.datetime.fromisoformat(played_at)
+    if played_at.tzinfo is None:
+        played_at = played_at.replace(tzinfo=datetime.timezone.utc)
+    return (player_name, game_time_seconds, won, difficulty, score, hints_remaining, played_at)
+
+
+# Сводные таблицы обновляются триггером в той же транзакции, что и game_results:
+# при обновлении или удалении строки вычитается ее старый вклад и добавляется новый.
+# Лучшие очки и время хранятся как рекорд за все время и не уменьшаются.
+# Сам триггер создается только если его нет: пересоздание при каждом запуске клиента
+# брало бы исключительную блокировку game_results.
+STATS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS player_stats (
+        player_name VARCHAR(100) PRIMARY KEY,
+        games INTEGER NOT NULL DEFAULT 0,
+        wins INTEGER NOT NULL DEFAULT 0,
+        total_score BIGINT NOT NULL DEFAULT 0,
+        best_score INTEGER,
+        best_time_seconds INTEGER
+    );
+    CREATE TABLE IF NOT EXISTS difficulty_stats (
+        difficulty VARCHAR(20) PRIMARY KEY,
+        games INTEGER NOT NULL DEFAULT 0,
+        wins INTEGER NOT NULL DEFAULT 0,
+        total_score BIGINT NOT NULL DEFAULT 0,
+        best_score INTEGER,
+        best_time_seconds INTEGER
+    );
+    CREATE TABLE IF NOT EXISTS daily_stats (
+        day DATE NOT NULL,
+        difficulty VARCHAR(20) NOT NULL,
+        games INTEGER NOT NULL DEFAULT 0,
+        wins INTEGER NOT NULL DEFAULT 0,
+        total_score BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, difficulty)
+    );
+
+    CREATE OR REPLACE FUNCTION game_results_stats() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            UPDATE player_stats SET
+                games = games - 1,
+                wins = wins - OLD.won::int,
+                total_score = total_score - COALESCE(OLD.score, 0)
+            WHERE player_name = OLD.player_name;
+            UPDATE difficulty_stats SET
+                games = games - 1,
+                wins = wins - OLD.won::int,
+                total_score = total_score - COALESCE(OLD.score, 0)
+            WHERE difficulty = OLD.difficulty;
+            UPDATE daily_stats SET
+                games = games - 1,
+                wins = wins - OLD.won::int,
+                total_score = total_score - COALESCE(OLD.score, 0)
+            WHERE day = OLD.played_at::date AND difficulty = OLD.difficulty;
+        END IF;
+
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO player_stats AS s
+                (player_name, games, wins, total_score, best_score, best_time_seconds)
+            VALUES (NEW.player_name, 1, NEW.won::int, COALESCE(NEW.score, 0), NEW.score,
+                    CASE WHEN NEW.won THEN NEW.game_time_seconds END)
+            ON CONFLICT (player_name) DO UPDATE SET
+                games = s.games + 1,
+                wins = s.wins + EXCLUDED.wins,
+                total_score = s.total_score + EXCLUDED.total_score,
+                best_score = GREATEST(s.best_score, EXCLUDED.best_score),
+                best_time_seconds = LEAST(s.best_time_seconds, EXCLUDED.best_time_seconds);
+            INSERT INTO difficulty_stats AS s
+                (difficulty, games, wins, total_score, best_score, best_time_seconds)
+            VALUES (NEW.difficulty, 1, NEW.won::int, COALESCE(NEW.score, 0), NEW.score,
+                    CASE WHEN NEW.won THEN NEW.game_time_seconds END)
+            ON CONFLICT (difficulty) DO UPDATE SET
+                games = s.games + 1,
+                wins = s.wins + EXCLUDED.wins,
+                total_score = s.total_score + EXCLUDED.total_score,
+                best_score = GREATEST(s.best_score, EXCLUDED.best_score),
+                best_time_seconds = LEAST(s.best_time_seconds, EXCLUDED.best_time_seconds);
+            INSERT INTO daily_stats AS s (day, difficulty, games, wins, total_score)
+            VALUES (NEW.played_at::date, NEW.difficulty, 1, NEW.won::int, COALESCE(NEW.score, 0))
+            ON CONFLICT (day, difficulty) DO UPDATE SET
+                games = s.games + 1,
+                wins = s.wins + EXCLUDED.wins,
+                total_score = s.total_score + EXCLUDED.total_score;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DO $$
+    BEGIN
+        IF NOT EXISTS (
+            SELECT 1 FROM pg_trigger
+            WHERE tgname = 'game_results_stats_trigger' AND tgrelid = 'game_results'::regclass
+        ) THEN
+            CREATE TRIGGER game_results_stats_trigger
+                AFTER INSERT OR UPDATE OR DELETE ON game_results
+                FOR EACH ROW EXECUTE PROCEDURE game_results_stats();
+        END IF;
+    END;
+    $$;
+"""
+
+# Схема создается под транзакционной блокировкой: клиенты, запущенные одновременно
+# на пустой базе, выполняют создание и заполнение сводок по очереди
+SCHEMA_LOCK_KEY = 0x50C17A1E
+
+# Однократное заполнение сводок по уже накопленным результатам
+STATS_BACKFILL = """
+    INSERT INTO player_stats (player_name, games, wins, total_score, best_score, best_time_seconds)
+    SELECT player_name, count(*), count(*) FILTER (WHERE won), COALESCE(sum(score), 0), max(score),
+           min(game_time_seconds) FILTER (WHERE won)
+    FROM game_results GROUP BY player_name
+    ON CONFLICT DO NOTHING;
+    INSERT INTO difficulty_stats (difficulty, games, wins, total_score, best_score, best_time_seconds)
+    SELECT difficulty, count(*), count(*) FILTER (WHERE won), COALESCE(sum(score), 0), max(score),
+           min(game_time_seconds) FILTER (WHERE won)
+    FROM game_results GROUP BY difficulty
+    ON CONFLICT DO NOTHING;
+    INSERT INTO daily_stats (day, difficulty, games, wins, total_score)
+    SELECT played_at::date, difficulty, count(*), count(*) FILTER (WHERE won), COALESCE(sum(score), 0)
+    FROM game_results GROUP BY played_at::date, difficulty
+    ON CONFLICT DO NOTHING;
+"""
+
+# Схема создается один раз на процесс для каждой базы
+_schema_lock = threading.Lock()
+_schema_ready = set()
+
+_shared_manager = None
+_shared_lock = threading.Lock()
+
+
+def get_database_manager(kind=None, **kwargs):
+    # Без psycopg2 результаты хранятся во встроенной SQLite, а не теряются
+    global _shared_manager
+    with _shared_lock:
+        if _shared_manager is None:
+            kind = kind or os.environ.get('SOLITAIRE_STORAGE') or ('postgres' if PSYCOPG2_AVAILABLE else 'sqlite')
+            if kind == 'sqlite':
+                _shared_manager = SQLiteBackend(**kwargs)
+            else:
+                _shared_manager = DatabaseManager(**kwargs)
+        return _shared_manager
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.01):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, item):
+        for position in self.positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(item))
+
+
+class NameCache:
+    def __init__(self, capacity, error_rate=0.01, lru_size=1024):
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.lru_size = lru_size
+        self.confirmed = OrderedDict()
+        self.lock = threading.Lock()
+        self.ready = False
+
+    def check(self, name):
+        # True — имя точно занято, False — точно свободно, None — нужно спросить базу
+        with self.lock:
+            if name in self.confirmed:
+                self.confirmed.move_to_end(name)
+                return True
+        if self.ready and name not in self.bloom:
+            return False
+        return None
+
+    def confirm(self, name):
+        self.bloom.add(name)
+        with self.lock:
+            self.confirmed[name] = True
+            self.confirmed.move_to_end(name)
+            while len(self.confirmed) > self.lru_size:
+                self.confirmed.popitem(last=False)
+
+
+class StorageBackend:
+    name_cache = None
+    name_cache_failed = False
+
+    def connect(self):
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+    def init_database(self):
+        raise NotImplementedError
+
+    def lookup_player_name(self, name):
+        raise NotImplementedError
+
+    def count_player_names(self):
+        raise NotImplementedError
+
+    def iter_player_names(self):
+        raise NotImplementedError
+
+    def write_results(self, rows):
+        raise NotImplementedError
+
+    def cached_player_name(self, name):
+        # Ответ без обращения к базе; None — кеш не уверен или еще не загружен
+        cache = self.name_cache
+        return cache.check(name) if cache else None
+
+    def player_name_exists(self, name):
+        known = self.cached_player_name(name)
+        if known is not None:
+            return known
+        exists = self.lookup_player_name(name)
+        cache = self.name_cache
+        if exists and cache:
+            cache.confirm(name)
+        return exists
+
+    def save_result(self, player_name, game_time_seconds, won, difficulty="medium", score=0, hints_remaining=-1,
+                    played_at=None):
+        return self.save_results([
+            (player_name, game_time_seconds, won, difficulty, score, hints_remaining, played_at)
+        ])
+
+    def save_results(self, rows):
+        if not rows:
+            return True
+        rows = [result_row(*row) for row in rows]
+        saved = self.write_results(rows)
+        if saved and self.name_cache:
+            for row in rows:
+                self.name_cache.confirm(row[0])
+        return saved
+
+    def load_name_cache(self, error_rate=0.01, lru_size=1024):
+        try:
+            count = self.count_player_names()
+            if count is None:
+                self.name_cache_failed = True
+                return False
+            # Запас вдвое под новых игроков: дальше фильтр просто чаще ошибается в сторону «возможно есть»
+            cache = NameCache(max(count * 2, 1024), error_rate, lru_size)
+            # Кеш подключается до загрузки, чтобы не потерять имена, сохраненные во время нее
+            self.name_cache = cache
+            for name in self.iter_player_names():
+                cache.bloom.add(name)
+            cache.ready = True
+            self.name_cache_failed = False
+            return True
+        except Exception as e:
+            print(f"Ошибка загрузки имен игроков: {e}")
+            self.name_cache = None
+            self.name_cache_failed = True
+            return False
+
+    def get_results(self, limit=10):
+        raise NotImplementedError
+
+    def get_leaderboard(self, limit=20, after=None, difficulty=None, won=None):
+        raise NotImplementedError
+
+    def get_stats(self, player_name=None, days=7):
+        raise NotImplementedError
+
+
+class DatabaseManager(StorageBackend):
     def __init__(self, host='localhost', port=5432, database='solit_db',
-                 user='evgeniykazantseva', password=''):
+                 user='evgeniykazantseva', password='',
+                 min_connections=1, max_connections=4, connect_timeout=5, idle_check_seconds=30):
         self.host = host
         self.port = port
         self.database = database
         self.user = user
         self.password = password
-        self.conn = None
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.connect_timeout = connect_timeout
+        self.idle_check_seconds = idle_check_seconds
+        self.pool = None
+        self.pool_lock = threading.Lock()
+        self.last_used = {}
+
     def connect(self):
         if not PSYCOPG2_AVAILABLE:
             print("psycopg2 не установлен. База данных недоступна.")
             return False
+        with self.pool_lock:
+            if self.pool is not None:
+                return True
+            try:
+                load_psycopg2()
+                self.pool = psycopg2.pool.ThreadedConnectionPool(
+                    self.min_connections,
+                    self.max_connections,
+                    host=self.host,
+                    port=self.port,
+                    database=self.database,
+                    user=self.user,
+                    password=self.password,
+                    connect_timeout=self.connect_timeout
+                )
+                return True
+            except Exception as e:
+                print(f"Ошибка подключения к базе данных: {e}")
+                return False
+
+    def close(self):
+        with self.pool_lock:
+            if self.pool:
+                self.pool.closeall()
+                self.pool = None
+                self.last_used.clear()
+
+    def is_healthy(self, conn):
+        if conn.closed:
+            return False
+        # Проверяем только соединения, которые долго простаивали
+        if time.monotonic() - self.last_used.get(id(conn), 0) < self.idle_check_seconds:
+            return True
         try:
-            self.conn = psycopg2.connect(
-                host=self.host,
-                port=self.port,
-                database=self.database,
-                user=self.user,
-                password=self.password
-            )
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+            conn.rollback()
             return True
-        except Exception as e:
-            print(f"Ошибка подключения к базе данных: {e}")
-            return False
-    def close(self):
-        if self.conn:
-            self.conn.close()
-            self.conn = None
-    def player_name_exists(self, name):
-        if not self.conn and not self.connect():
+        except Exception:
             return False
+
+    @perf.timed('db.postgres.acquire')
+    def acquire(self):
+        for _ in range(2):
+            if not self.connect():
+                return None
+            try:
+                conn = self.pool.getconn()
+            except psycopg2.pool.PoolError as e:
+                print(f"Нет свободных соединений в пуле: {e}")
+                return None
+            except Exception as e:
+                print(f"Ошибка получения соединения из пула: {e}")
+                # Сервер мог перезапуститься — пересоздаем пул
+                self.close()
+                continue
+            if self.is_healthy(conn):
+                return conn
+            self.release(conn, broken=True)
+        return None
+
+    def release(self, conn, broken=False):
+        with self.pool_lock:
+            if broken or conn.closed:
+                self.last_used.pop(id(conn), None)
+            else:
+                self.last_used[id(conn)] = time.monotonic()
+            if self.pool:
+                self.pool.putconn(conn, close=broken or bool(conn.closed))
+            elif not conn.closed:
+                conn.close()
+
+    def schema_key(self):
+        return (self.host, self.port, self.database)
+
+    @contextmanager
+    def cursor(self, ensure_schema=True):
+        # Если сервер был недоступен при запуске, схема создается при первом удачном обращении
+        if ensure_schema and self.schema_key() not in _schema_ready and not self.init_database():
+            raise ConnectionError("схема базы данных не создана")
+        conn = self.acquire()
+        if conn is None:
+            raise ConnectionError("база данных недоступна")
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("SELECT 1 FROM game_results WHERE player_name = %s LIMIT 1;", (name,))
-            result = cursor.fetchone()
-            cursor.close()
-            return result is not None
+            with conn.cursor() as cursor:
+                yield cursor
+            conn.commit()
+        except Exception:
+            broken = False
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+            self.release(conn, broken)
+            raise
+        self.release(conn)
+
+    @perf.timed('db.postgres.lookup_player_name')
+    def lookup_player_name(self, name):
+        try:
+            with self.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM game_results WHERE player_name = %s LIMIT 1;", (name,))
+                return cursor.fetchone() is not None
         except Exception as e:
             print(f"Ошибка при проверке имени: {e}")
             return False
+
+    def count_player_names(self):
+        try:
+            with self.cursor() as cursor:
+                cursor.execute("SELECT count(*) FROM game_results;")
+                return cursor.fetchone()[0]
+        except Exception as e:
+            print(f"Ошибка при подсчете игроков: {e}")
+            return None
+
+    def iter_player_names(self, batch_size=10000):
+        conn = self.acquire()
+        if conn is None:
+            return
+        broken = False
+        try:
+            # Серверный курсор: имена приходят пачками, а не все сразу
+            with conn.cursor(name='player_names') as cursor:
+                cursor.itersize = batch_size
+                cursor.execute("SELECT player_name FROM game_results;")
+                for (name,) in cursor:
+                    yield name
+            conn.commit()
+        except Exception:
+            broken = True
+            raise
+        finally:
+            self.release(conn, broken)
+
+    @perf.timed('db.postgres.init_database')
     def init_database(self):
-        if not self.connect():
+        key = self.schema_key()
+        with _schema_lock:
+            if key in _schema_ready:
+                return self.connect()
+            try:
+                with self.cursor(ensure_schema=False) as cursor:
+                    cursor.execute("SELECT pg_advisory_xact_lock(%s);", (SCHEMA_LOCK_KEY,))
+                    cursor.execute("""
+                        CREATE TABLE IF NOT EXISTS game_results (
+                            id SERIAL PRIMARY KEY,
+                            player_name VARCHAR(100) NOT NULL UNIQUE,
+                            game_time_seconds INTEGER,
+                            won BOOLEAN NOT NULL,
+                            difficulty VARCHAR(20) NOT NULL DEFAULT 'medium',
+                            score INTEGER DEFAULT 0,
+                            hints_remaining INTEGER DEFAULT -1
+                        );
+                    """)
+                    # ALTER TABLE берет исключительную блокировку даже без изменений — только если столбца нет
+                    cursor.execute("""
+                        SELECT 1 FROM information_schema.columns
+                        WHERE table_schema = current_schema()
+                          AND table_name = 'game_results' AND column_name = 'played_at';
+                    """)
+                    if cursor.fetchone() is None:
+                        cursor.execute("""
+                            ALTER TABLE game_results
+                            ADD COLUMN IF NOT EXISTS played_at TIMESTAMP NOT NULL DEFAULT now();
+                        """)
+                    cursor.execute("""
+                        CREATE INDEX IF NOT EXISTS game_results_leaderboard_idx
+                        ON game_results ((-COALESCE(score, 0)), (COALESCE(game_time_seconds, 2147483647)), id);
+                    """)
+                    cursor.execute("""
+                        CREATE INDEX IF NOT EXISTS game_results_difficulty_leaderboard_idx
+                        ON game_results (difficulty, won, (-COALESCE(score, 0)),
+                                         (COALESCE(game_time_seconds, 2147483647)), id);
+                    """)
+                    # Фильтр только по сложности или только по исходу тоже читает страницу из индекса
+                    cursor.execute("""
+                        CREATE INDEX IF NOT EXISTS game_results_difficulty_only_leaderboard_idx
+                        ON game_results (difficulty, (-COALESCE(score, 0)),
+                                         (COALESCE(game_time_seconds, 2147483647)), id);
+                    """)
+                    cursor.execute("""
+                        CREATE INDEX IF NOT EXISTS game_results_won_leaderboard_idx
+                        ON game_results (won, (-COALESCE(score, 0)),
+                                         (COALESCE(game_time_seconds, 2147483647)), id);
+                    """)
+                    cursor.execute("SELECT to_regclass('difficulty_stats') IS NULL;")
+                    needs_backfill = cursor.fetchone()[0]
+                    cursor.execute(STATS_SCHEMA)
+                    if needs_backfill:
+                        cursor.execute(STATS_BACKFILL)
+            except Exception as e:
+                print(f"Ошибка создания таблицы: {e}")
+                return False
+            _schema_ready.add(key)
+            return True
+
+    @perf.timed('db.postgres.write_results')
+    def write_results(self, rows):
+        # ON CONFLICT не может обновить одну строку дважды за команду — оставляем последний результат игрока
+        latest = {}
+        for row in rows:
+            latest[row[0]] = tuple(row)
+        try:
+            with self.cursor() as cursor:
+                # played_at передается с часовым поясом и приводится к поясу сеанса, как и now()
+                psycopg2.extras.execute_values(cursor, """
+                    INSERT INTO game_results
+                        (player_name, game_time_seconds, won, difficulty, score, hints_remaining, played_at)
+                    VALUES %s
+                    ON CONFLICT (player_name) DO UPDATE SET
+                        game_time_seconds = EXCLUDED.game_time_seconds,
+                        won = EXCLUDED.won,
+                        difficulty = EXCLUDED.difficulty,
+                        score = EXCLUDED.score,
+                        hints_remaining = EXCLUDED.hints_remaining,
+                        played_at = EXCLUDED.played_at;
+                """, list(latest.values()), page_size=500)
+            return True
+        except Exception as e:
+            print(f"Ошибка сохранения результата: {e}")
             return False
+
+    @perf.timed('db.postgres.get_results')
+    def get_results(self, limit=10):
+        try:
+            with self.cursor() as cursor:
+                cursor.execute("""
+                    SELECT id, player_name, game_time_seconds, won, difficulty, score, hints_remaining
+                    FROM game_results
+                    ORDER BY id DESC
+                    LIMIT %s;
+                """, (limit,))
+                return cursor.fetchall()
+        except Exception as e:
+            print(f"Ошибка при получении результатов: {e}")
+            return []
+
+    @perf.timed('db.postgres.get_leaderboard')
+    def get_leaderboard(self, limit=20, after=None, difficulty=None, won=None):
+        conditions = []
+        params = []
+        if difficulty is not None:
+            conditions.append("difficulty = %s")
+            params.append(difficulty)
+        if won is not None:
+            conditions.append("won = %s")
+            params.append(won)
+        if after is not None:
+            conditions.append(f"({LEADERBOARD_KEY}) > (%s, %s, %s)")
+            params.extend(leaderboard_key(after))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        params.append(limit)
+
+        try:
+            with self.cursor() as cursor:
+                cursor.execute(f"""
+                    SELECT id, player_name, game_time_seconds, won, difficulty, score, hints_remaining
+                    FROM game_results
+                    {where}
+                    ORDER BY {LEADERBOARD_KEY}
+                    LIMIT %s;
+                """, params)
+                return cursor.fetchall()
+        except Exception as e:
+            print(f"Ошибка при получении таблицы рекордов: {e}")
+            return []
+
+    @perf.timed('db.postgres.get_stats')
+    def get_stats(self, player_name=None, days=7):
+        stats = {'difficulties': [], 'player': None, 'daily': []}
         try:
+            with self.cursor() as cursor:
+                cursor.execute("""
+                    SELECT difficulty, games, wins, total_score, best_score, best_time_seconds
+                    FROM difficulty_stats
+                    ORDER BY difficulty;
+                """)
+                stats['difficulties'] = cursor.fetchall()
+                if player_name:
+                    cursor.execute("""
+                        SELECT player_name, games, wins, total_score, best_score, best_time_seconds
+                        FROM player_stats
+                        WHERE player_name = %s;
+                    """, (player_name,))
+                    stats['player'] = cursor.fetchone()
+                cursor.execute("""
+                    SELECT day, difficulty, games, wins, total_score
+                    FROM daily_stats
+                    WHERE day > CURRENT_DATE - %s
+                    ORDER BY day DESC, difficulty;
+                """, (days,))
+                stats['daily'] = cursor.fetchall()
+            return stats
+        except Exception as e:
+            print(f"Ошибка при получении статистики: {e}")
+            return None
+
+
+SQLITE_STATS_REMOVE = """
+    UPDATE player_stats SET games = games - 1, wins = wins - OLD.won,
+        total_score = total_score - COALESCE(OLD.score, 0)
+    WHERE player_name = OLD.player_name;
+    UPDATE difficulty_stats SET games = games - 1, wins = wins - OLD.won,
+        total_score = total_score - COALESCE(OLD.score, 0)
+    WHERE difficulty = OLD.difficulty;
+    UPDATE daily_stats SET games = games - 1, wins = wins - OLD.won,
+        total_score = total_score - COALESCE(OLD.score, 0)
+    WHERE day = date(OLD.played_at) AND difficulty = OLD.difficulty;
+"""
+
+# Внутри триггера политика конфликта внешнего UPSERT перекрывает OR IGNORE,
+# поэтому строки сводок создаются через NOT EXISTS
+SQLITE_STATS_ADD = """
+    INSERT INTO player_stats (player_name) SELECT NEW.player_name
+    WHERE NOT EXISTS (SELECT 1 FROM player_stats WHERE player_name = NEW.player_name);
+    UPDATE player_stats SET games = games + 1, wins = wins + NEW.won,
+        total_score = total_score + COALESCE(NEW.score, 0),
+        best_score = CASE WHEN best_score IS NULL OR NEW.score > best_score THEN NEW.score ELSE best_score END,
+        best_time_seconds = CASE
+            WHEN NEW.won AND (best_time_seconds IS NULL OR NEW.game_time_seconds < best_time_seconds)
+            THEN NEW.game_time_seconds ELSE best_time_seconds END
+    WHERE player_name = NEW.player_name;
+    INSERT INTO difficulty_stats (difficulty) SELECT NEW.difficulty
+    WHERE NOT EXISTS (SELECT 1 FROM difficulty_stats WHERE difficulty = NEW.difficulty);
+    UPDATE difficulty_stats SET games = games + 1, wins = wins + NEW.won,
+        total_score = total_score + COALESCE(NEW.score, 0),
+        best_score = CASE WHEN best_score IS NULL OR NEW.score > best_score THEN NEW.score ELSE best_score END,
+        best_time_seconds = CASE
+            WHEN NEW.won AND (best_time_seconds IS NULL OR NEW.game_time_seconds < best_time_seconds)
+            THEN NEW.game_time_seconds ELSE best_time_seconds END
+    WHERE difficulty = NEW.difficulty;
+    INSERT INTO daily_stats (day, difficulty) SELECT date(NEW.played_at), NEW.difficulty
+    WHERE NOT EXISTS (SELECT 1 FROM daily_stats WHERE day = date(NEW.played_at) AND difficulty = NEW.difficulty);
+    UPDATE daily_stats SET games = games + 1, wins = wins + NEW.won,
+        total_score = total_score + COALESCE(NEW.score, 0)
+    WHERE day = date(NEW.played_at) AND difficulty = NEW.difficulty;
+"""
+
+SQLITE_SCHEMA = f"""
+    CREATE TABLE IF NOT EXISTS game_results (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        player_name TEXT NOT NULL UNIQUE,
+        game_time_seconds INTEGER,
+        won INTEGER NOT NULL,
+        difficulty TEXT NOT NULL DEFAULT 'medium',
+        score INTEGER DEFAULT 0,
+        hints_remaining INTEGER DEFAULT -1,
+        played_at TEXT NOT NULL DEFAULT (datetime('now'))
+    );
+    CREATE INDEX IF NOT EXISTS game_results_leaderboard_idx
+    ON game_results (-COALESCE(score, 0), COALESCE(game_time_seconds, 2147483647), id);
+    CREATE INDEX IF NOT EXISTS game_results_difficulty_leaderboard_idx
+    ON game_results (difficulty, won, -COALESCE(score, 0), COALESCE(game_time_seconds, 2147483647), id);
+    CREATE INDEX IF NOT EXISTS game_results_difficulty_only_leaderboard_idx
+    ON game_results (difficulty, -COALESCE(score, 0), COALESCE(game_time_seconds, 2147483647), id);
+    CREATE INDEX IF NOT EXISTS game_results_won_leaderboard_idx
+    ON game_results (won, -COALESCE(score, 0), COALESCE(game_time_seconds, 2147483647), id);
+
+    CREATE TABLE IF NOT EXISTS player_stats (
+        player_name TEXT PRIMARY KEY,
+        games INTEGER NOT NULL DEFAULT 0,
+        wins INTEGER NOT NULL DEFAULT 0,
+        total_score INTEGER NOT NULL DEFAULT 0,
+        best_score INTEGER,
+        best_time_seconds INTEGER
+    );
+    CREATE TABLE IF NOT EXISTS difficulty_stats (
+        difficulty TEXT PRIMARY KEY,
+        games INTEGER NOT NULL DEFAULT 0,
+        wins INTEGER NOT NULL DEFAULT 0,
+        total_score INTEGER NOT NULL DEFAULT 0,
+        best_score INTEGER,
+        best_time_seconds INTEGER
+    );
+    CREATE TABLE IF NOT EXISTS daily_stats (
+        day TEXT NOT NULL,
+        difficulty TEXT NOT NULL,
+        games INTEGER NOT NULL DEFAULT 0,
+        wins INTEGER NOT NULL DEFAULT 0,
+        total_score INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, difficulty)
+    );
+
+    CREATE TRIGGER IF NOT EXISTS game_results_stats_insert AFTER INSERT ON game_results
+    BEGIN {SQLITE_STATS_ADD} END;
+    CREATE TRIGGER IF NOT EXISTS game_results_stats_update AFTER UPDATE ON game_results
+    BEGIN {SQLITE_STATS_REMOVE} {SQLITE_STATS_ADD} END;
+    CREATE TRIGGER IF NOT EXISTS game_results_stats_delete AFTER DELETE ON game_results
+    BEGIN {SQLITE_STATS_REMOVE} END;
+"""
+
+
+class SQLiteBackend(StorageBackend):
+    def __init__(self, path='solitaire.db', cached_statements=64):
+        self.path = path
+        self.cached_statements = cached_statements
+        self.conn = None
+        # Одно соединение на процесс, доступ из потока записи и из интерфейса по очереди
+        self.lock = threading.RLock()
+
+    def connect(self):
+        with self.lock:
+            if self.conn is not None:
+                return True
+            try:
+                # Скомпилированные запросы кешируются соединением и переиспользуются
+                self.conn = sqlite3.connect(self.path, check_same_thread=False,
+                                            cached_statements=self.cached_statements)
+                self.conn.execute("PRAGMA journal_mode=WAL;")
+                self.conn.execute("PRAGMA synchronous=NORMAL;")
+                return True
+            except sqlite3.Error as e:
+                print(f"Ошибка открытия базы SQLite: {e}")
+                self.conn = None
+                return False
+
+    def close(self):
+        with self.lock:
+            if self.conn:
+                self.conn.close()
+                self.conn = None
+
+    @contextmanager
+    def cursor(self):
+        with self.lock:
+            if not self.connect():
+                raise ConnectionError("база данных недоступна")
             cursor = self.conn.cursor()
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS game_results (
-                    id SERIAL PRIMARY KEY,
-                    player_name VARCHAR(100) NOT NULL UNIQUE,
-                    game_time_seconds INTEGER,
-                    won BOOLEAN NOT NULL,
-                    difficulty VARCHAR(20) NOT NULL DEFAULT 'medium',
-                    score INTEGER DEFAULT 0,
-                    hints_remaining INTEGER DEFAULT -1
-                );
-            """)
-            self.conn.commit()
-            cursor.close()
+            try:
+                yield cursor
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def count_player_names(self):
+        try:
+            with self.cursor() as cursor:
+                cursor.execute("SELECT count(*) FROM game_results;")
+                return cursor.fetchone()[0]
+        except Exception as e:
+            print(f"Ошибка при подсчете игроков: {e}")
+            return None
+
+    def iter_player_names(self):
+        with self.cursor() as cursor:
+            cursor.execute("SELECT player_name FROM game_results;")
+            names = [name for (name,) in cursor.fetchall()]
+        return iter(names)
+
+    @perf.timed('db.sqlite.init_database')
+    def init_database(self):
+        key = ('sqlite', os.path.abspath(self.path) if self.path != ':memory:' else id(self))
+        with _schema_lock:
+            if key in _schema_ready:
+                return self.connect()
+            try:
+                with self.cursor():
+                    self.conn.executescript(SQLITE_SCHEMA)
+            except Exception as e:
+                print(f"Ошибка создания таблицы: {e}")
+                return False
+            _schema_ready.add(key)
             return True
+
+    @perf.timed('db.sqlite.lookup_player_name')
+    def lookup_player_name(self, name):
+        try:
+            with self.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM game_results WHERE player_name = ? LIMIT 1;", (name,))
+                return cursor.fetchone() is not None
         except Exception as e:
-            print(f"Ошибка создания таблицы: {e}")
-            return False
-    def save_result(self, player_name, game_time_seconds, won, difficulty="medium", score=0, hints_remaining=-1):
-        if not self.conn and not self.connect():
+            print(f"Ошибка при проверке имени: {e}")
             return False
+
+    @perf.timed('db.sqlite.write_results')
+    def write_results(self, rows):
+        latest = {}
+        for row in rows:
+            # В том же виде, что и datetime('now'): UTC с точностью до секунды
+            played_at = row[6].astimezone(datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+            latest[row[0]] = tuple(row[:6]) + (played_at,)
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("""
-                INSERT INTO game_results
-                    (player_name, game_time_seconds, won, difficulty, score, hints_remaining)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                ON CONFLICT (player_name) DO UPDATE SET
-                    game_time_seconds = EXCLUDED.game_time_seconds,
-                    won = EXCLUDED.won,
-                    difficulty = EXCLUDED.difficulty,
-                    score = EXCLUDED.score,
-                    hints_remaining = EXCLUDED.hints_remaining;
-            """, (player_name, game_time_seconds, won, difficulty, score, hints_remaining))
-            self.conn.commit()
-            cursor.close()
+            with self.cursor() as cursor:
+                cursor.executemany("""
+                    INSERT INTO game_results
+                        (player_name, game_time_seconds, won, difficulty, score, hints_remaining, played_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (player_name) DO UPDATE SET
+                        game_time_seconds = excluded.game_time_seconds,
+                        won = excluded.won,
+                        difficulty = excluded.difficulty,
+                        score = excluded.score,
+                        hints_remaining = excluded.hints_remaining,
+                        played_at = excluded.played_at;
+                """, list(latest.values()))
             return True
         except Exception as e:
             print(f"Ошибка сохранения результата: {e}")
             return False
+
+    @perf.timed('db.sqlite.get_results')
     def get_results(self, limit=10):
-        if not PSYCOPG2_AVAILABLE:
+        try:
+            with self.cursor() as cursor:
+                cursor.execute("""
+                    SELECT id, player_name, game_time_seconds, won, difficulty, score, hints_remaining
+                    FROM game_results
+                    ORDER BY id DESC
+                    LIMIT ?;
+                """, (limit,))
+                return cursor.fetchall()
+        except Exception as e:
+            print(f"Ошибка при получении результатов: {e}")
             return []
-        if not self.conn and not self.connect():
+
+    @perf.timed('db.sqlite.get_leaderboard')
+    def get_leaderboard(self, limit=20, after=None, difficulty=None, won=None):
+        conditions = []
+        params = []
+        if difficulty is not None:
+            conditions.append("difficulty = ?")
+            params.append(difficulty)
+        if won is not None:
+            conditions.append("won = ?")
+            params.append(int(won))
+        if after is not None:
+            score, secs, id_ = leaderboard_key(after)
+            conditions.append(SQLITE_LEADERBOARD_AFTER)
+            params.extend((score, score, secs, secs, id_))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        params.append(limit)
+
+        try:
+            with self.cursor() as cursor:
+                cursor.execute(f"""
+                    SELECT id, player_name, game_time_seconds, won, difficulty, score, hints_remaining
+                    FROM game_results
+                    {where}
+                    ORDER BY {LEADERBOARD_KEY}
+                    LIMIT ?;
+                """, params)
+                return cursor.fetchall()
+        except Exception as e:
+            print(f"Ошибка при получении таблицы рекордов: {e}")
             return []
+
+    @perf.timed('db.sqlite.get_stats')
+    def get_stats(self, player_name=None, days=7):
+        stats = {'difficulties': [], 'player': None, 'daily': []}
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("""
-                SELECT id, player_name, game_time_seconds, won, difficulty, score, hints_remaining
-                FROM game_results
-                ORDER BY id DESC
-                LIMIT %s;
-            """, (limit,))
-            results = cursor.fetchall()
-            cursor.close()
-            return results
+            with self.cursor() as cursor:
+                cursor.execute("""
+                    SELECT difficulty, games, wins, total_score, best_score, best_time_seconds
+                    FROM difficulty_stats
+                    ORDER BY difficulty;
+                """)
+                stats['difficulties'] = cursor.fetchall()
+                if player_name:
+                    cursor.execute("""
+                        SELECT player_name, games, wins, total_score, best_score, best_time_seconds
+                        FROM player_stats
+                        WHERE player_name = ?;
+                    """, (player_name,))
+                    stats['player'] = cursor.fetchone()
+                cursor.execute("""
+                    SELECT day, difficulty, games, wins, total_score
+                    FROM daily_stats
+                    WHERE day > date('now', ?)
+                    ORDER BY day DESC, difficulty;
+                """, (f"-{int(days)} days",))
+                stats['daily'] = [
+                    (datetime.date.fromisoformat(day),) + tuple(rest) for day, *rest in cursor.fetchall()
+                ]
+            return stats
         except Exception as e:
-            print(f"Ошибка при получении результатов: {e}")
-            return []
\ No newline at end of file
+            print(f"Ошибка при получении статистики: {e}")
+            return None
+
+
+class ResultWriter:
+    def __init__(self, db, spool_path='results_spool.jsonl', max_pending=1000, retry_seconds=30,
+                 batch_size=50, flush_seconds=2.0):
+        self.db = db
+        self.spool_path = spool_path
+        self.retry_seconds = retry_seconds
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.queue = queue.Queue(max_pending)
+        self.buffer = []
+        self.buffer_started = 0.0
+        self.name_cache_retry_at = 0.0
+        self.spool_lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, name='result-writer', daemon=True)
+        self.thread.start()
+
+    def save_result(self, player_name, game_time_seconds, won, difficulty="medium", score=0,
+                    hints_remaining=-1, callback=None):
+        played_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        row = [player_name, game_time_seconds, won, difficulty, score, hints_remaining, played_at]
+        try:
+            self.queue.put_nowait(('save', row, callback))
+        except queue.Full:
+            # Очередь переполнена — не ждем, а сразу откладываем на диск
+            self.spool([row])
+            if callback:
+                callback(False)
+
+    def get_results(self, limit=10, callback=None):
+        self.read(lambda: self.db.get_results(limit), callback, [])
+
+    def get_leaderboard(self, limit=20, after=None, difficulty=None, won=None, callback=None):
+        self.read(lambda: self.db.get_leaderboard(limit, after, difficulty, won), callback, [])
+
+    def get_stats(self, player_name=None, days=7, callback=None):
+        self.read(lambda: self.db.get_stats(player_name, days), callback)
+
+    def player_name_exists(self, name, callback=None):
+        # Промах кеша проверяется в потоке записи, чтобы не ждать базу в потоке интерфейса
+        known = self.db.cached_player_name(name)
+        if known is not None:
+            self.notify(callback, known)
+        else:
+            self.read(lambda: self.db.player_name_exists(name), callback)
+
+    def read(self, query, callback=None, default=None):
+        try:
+            self.queue.put_nowait(('read', (query, default), callback))
+        except queue.Full:
+            if callback:
+                callback(default)
+
+    def flush(self, timeout=5):
+        done = threading.Event()
+        try:
+            self.queue.put(('flush', None, lambda result: done.set()), timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def stop(self, timeout=5):
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self.thread.join(timeout)
+
+    def run(self):
+        self.flush_spool()
+        while True:
+            if self.buffer:
+                timeout = max(0.0, self.buffer_started + self.flush_seconds - time.monotonic())
+            else:
+                timeout = self.retry_seconds
+            try:
+                task = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                if self.buffer:
+                    self.flush_buffer()
+                else:
+                    self.flush_spool()
+                continue
+            if task is None:
+                self.flush_buffer()
+                break
+
+            kind, args, callback = task
+            if kind == 'save':
+                if not self.buffer:
+                    self.buffer_started = time.monotonic()
+                self.buffer.append((args, callback))
+                if len(self.buffer) >= self.batch_size:
+                    self.flush_buffer()
+                continue
+
+            # Перед чтением сбрасываем буфер, чтобы видеть собственные записи
+            self.flush_buffer()
+            if kind == 'flush':
+                result = True
+            else:
+                query, default = args
+                try:
+                    result = query()
+                    self.reload_name_cache()
+                except Exception as e:
+                    print(f"Ошибка фонового чтения из базы данных: {e}")
+                    result = default
+            self.notify(callback, result)
+
+    def reload_name_cache(self):
+        # Кеш имен не загрузился при запуске — пробуем снова, когда база опять отвечает
+        if not self.db.name_cache_failed or time.monotonic() < self.name_cache_retry_at:
+            return
+        self.db.name_cache_failed = False
+        self.name_cache_retry_at = time.monotonic() + self.retry_seconds
+        threading.Thread(target=self.db.load_name_cache, name='name-cache', daemon=True).start()
+
+    def notify(self, callback, result):
+        if not callback:
+            return
+        try:
+            callback(result)
+        except Exception as e:
+            # Ошибка получателя не должна останавливать поток записи
+            print(f"Ошибка обработки результата базы данных: {e}")
+
+    @perf.timed('db.writer.flush_buffer')
+    def flush_buffer(self):
+        if not self.buffer:
+            return
+        batch, self.buffer = self.buffer, []
+        rows = [args for args, _ in batch]
+        try:
+            saved = self.db.save_results(rows)
+        except Exception as e:
+            print(f"Ошибка фоновой записи в базу данных: {e}")
+            saved = False
+
+        perf.count('db.writer.batches')
+        perf.count('db.writer.rows', len(rows))
+        if saved:
+            self.flush_spool()
+            self.reload_name_cache()
+        else:
+            self.spool(rows)
+        for _, callback in batch:
+            self.notify(callback, saved)
+
+    def spool(self, rows):
+        perf.count('db.writer.spooled_rows', len(rows))
+        with self.spool_lock:
+            try:
+                with open(self.spool_path, 'a', encoding='utf-8') as f:
+                    for row in rows:
+                        f.write(json.dumps(row, ensure_ascii=False) + '\n')
+            except OSError as e:
+                print(f"Не удалось сохранить результат на диск: {e}")
+
+    def flush_spool(self):
+        with self.spool_lock:
+            if not os.path.exists(self.spool_path):
+                return
+            try:
+                with open(self.spool_path, encoding='utf-8') as f:
+                    rows = [json.loads(line) for line in f if line.strip()]
+            except (OSError, ValueError) as e:
+                print(f"Не удалось прочитать отложенные результаты: {e}")
+                return
+
+            pending = []
+            for start in range(0, len(rows), self.batch_size):
+                if not self.db.save_results(rows[start:start + self.batch_size]):
+                    # База снова недоступна — остаток ждет следующей попытки
+                    pending = rows[start:]
+                    break
+
+            try:
+                if pending:
+                    with open(self.spool_path, 'w', encoding='utf-8') as f:
+                        for row in pending:
+                            f.write(json.dumps(row, ensure_ascii=False) + '\n')
+                else:
+                    os.remove(self.spool_path)
+            except OSError as e:
+                print(f"Не удалось обновить файл отложенных результатов: {e}")
@@ -0,0 +1,181 @@
+import argparse
+import mmap
+import os
+import random
+import time
+
+from logic import Game_Solitaire
+import solver
+
+RECORD_SIZE = 52
+CARD_MASK = 0x3F
+
+# Код карты занимает 6 младших бит, в 2 старших бита каждого байта записываются метки:
+# байт 0 — статус, байты 1–8 — сложность (16 бит), байты 9–24 — номер раздачи (32 бита)
+STATUS_UNKNOWN = 0
+STATUS_WIN = 1
+STATUS_LOSS = 2
+STATUSES = {solver.UNKNOWN: STATUS_UNKNOWN, solver.WIN: STATUS_WIN, solver.LOSS: STATUS_LOSS}
+
+DIFFICULTY_OFFSET = 1
+SEED_OFFSET = 9
+MAX_DIFFICULTY = 0xFFFF
+NO_SEED = 0xFFFFFFFF
+
+# Сложность — число узлов поиска до решения
+DIFFICULTY_RANGES = {
+    'easy': (0, 299),
+    'medium': (300, 4999),
+    'hard': (5000, MAX_DIFFICULTY),
+}
+
+
+def put_bits(record, offset, value, pairs):
+    for i in range(pairs):
+        record[offset + i] |= ((value >> (2 * i)) & 0x3) << 6
+
+
+def get_bits(record, offset, pairs):
+    value = 0
+    for i in range(pairs):
+        value |= (record[offset + i] >> 6) << (2 * i)
+    return value
+
+
+def encode_record(deal, status=STATUS_UNKNOWN, difficulty=0, seed=None):
+    # Под номер раздачи 32 бита, а NO_SEED занят меткой «номера нет»: старшие биты иначе молча теряются
+    if seed is not None and not 0 <= seed < NO_SEED:
+        raise ValueError(f"Номер раздачи {seed} не помещается в запись банка")
+    record = bytearray(deal)
+    put_bits(record, 0, status, 1)
+    put_bits(record, DIFFICULTY_OFFSET, min(difficulty, MAX_DIFFICULTY), 8)
+    put_bits(record, SEED_OFFSET, NO_SEED if seed is None else seed, 16)
+    return bytes(record)
+
+
+def decode_record(record):
+    deal = bytes(byte & CARD_MASK for byte in record)
+    seed = get_bits(record, SEED_OFFSET, 16)
+    return {
+        'deal': deal,
+        'status': get_bits(record, 0, 1),
+        'difficulty': get_bits(record, DIFFICULTY_OFFSET, 8),
+        'seed': None if seed == NO_SEED else seed,
+    }
+
+
+class DealBank:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.count = size // RECORD_SIZE
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self.selections = {}
+
+    def __len__(self):
+        return self.count
+
+    def record(self, number):
+        start = number * RECORD_SIZE
+        return decode_record(self.data[start:start + RECORD_SIZE])
+
+    def status(self, number):
+        return self.data[number * RECORD_SIZE] >> 6
+
+    def difficulty(self, number):
+        start = number * RECORD_SIZE + DIFFICULTY_OFFSET
+        return get_bits(self.data[start:start + 8], 0, 8)
+
+    def matching(self, status, low=0, high=MAX_DIFFICULTY):
+        # Номера подходящих записей считаются один раз на диапазон
+        key = (status, low, high)
+        if key not in self.selections:
+            self.selections[key] = [
+                number for number in range(self.count)
+                if self.status(number) == status and low <= self.difficulty(number) <= high
+            ]
+        return self.selections[key]
+
+    def pick(self, status=STATUS_WIN, low=0, high=MAX_DIFFICULTY, rng=random):
+        numbers = self.matching(status, low, high)
+        if not numbers:
+            return None
+        return self.record(rng.choice(numbers))
+
+    def pick_game(self, difficulty, rng=random):
+        low, high = DIFFICULTY_RANGES[difficulty]
+        record = self.pick(STATUS_WIN, low, high, rng)
+        if record is None:
+            return None
+        return Game_Solitaire(record['seed'], record['deal'])
+
+    def close(self):
+        if self.data:
+            self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def banked_seeds(path):
+    seeds = set()
+    if not os.path.exists(path):
+        return seeds
+    with DealBank(path) as bank:
+        for number in range(len(bank)):
+            seeds.add(bank.record(number)['seed'])
+    return seeds
+
+
+def build(path, seeds, workers=None, node_limit=200000, time_limit=None, chunksize=4):
+    done = banked_seeds(path)
+    tasks = ((seed, node_limit, time_limit) for seed in seeds if seed not in done)
+    counts = {solver.WIN: 0, solver.LOSS: 0, solver.UNKNOWN: 0}
+
+    # Пул процессов нужен только при сборке банка, чтение банка из игры обходится без него
+    from multiprocessing import Pool, cpu_count
+
+    with Pool(workers or cpu_count()) as pool, open(path, 'ab') as out:
+        for result in pool.imap_unordered(solver.analyze_seed, tasks, chunksize):
+            deal = Game_Solitaire(result['seed']).deal
+            out.write(encode_record(deal, STATUSES[result['result']], result['nodes'], result['seed']))
+            out.flush()
+            counts[result['result']] += 1
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Банк заранее решенных раздач")
+    parser.add_argument('bank', nargs='?', default='deals.bin', help="файл банка раздач")
+    parser.add_argument('--build', action='store_true', help="дописать в банк новые раздачи")
+    parser.add_argument('--start', type=int, default=0, help="номер первой раздачи")
+    parser.add_argument('--count', type=int, default=1000, help="количество раздач")
+    parser.add_argument('--workers', type=int, default=None, help="количество процессов")
+    parser.add_argument('--nodes', type=int, default=200000, help="предел узлов поиска на раздачу")
+    parser.add_argument('--time', type=float, default=None, help="предел времени на раздачу, с")
+    args = parser.parse_args()
+    if args.start < 0 or args.count < 0 or args.start + args.count > NO_SEED:
+        parser.error(f"номера раздач должны лежать в диапазоне от 0 до {NO_SEED - 1}")
+
+    if args.build:
+        started = time.perf_counter()
+        counts = build(args.bank, range(args.start, args.start + args.count),
+                       args.workers, args.nodes, args.time)
+        print(f"Добавлено раздач: {sum(counts.values())} за {time.perf_counter() - started:.1f} с")
+
+    with DealBank(args.bank) as bank:
+        print(f"Раздач в банке: {len(bank)}")
+        for status, name in ((STATUS_WIN, "решаемых"), (STATUS_LOSS, "нерешаемых"),
+                             (STATUS_UNKNOWN, "не определено")):
+            print(f"  {name}: {len(bank.matching(status))}")
+        for difficulty, (low, high) in DIFFICULTY_RANGES.items():
+            print(f"  решаемых уровня {difficulty}: {len(bank.matching(STATUS_WIN, low, high))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import os
+import random
+import threading
+from collections import deque
+
+from logic import Game_Solitaire
+import dealbank
+import solver
+
+
+class DealPool:
+    def __init__(self, bank_path='deals.bin', target=5, node_limit=60000, time_limit=10.0, workers=1):
+        self.bank_path = bank_path
+        self.target = target
+        self.node_limit = node_limit
+        self.time_limit = time_limit
+        self.workers = workers
+        self.buckets = {difficulty: deque() for difficulty in dealbank.DIFFICULTY_RANGES}
+        self.rng = random.Random()
+        self.wakeup = threading.Event()
+        self.stopped = False
+        self.thread = None
+        self.executor = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='deal-pool', daemon=True)
+        self.thread.start()
+
+    def take(self, difficulty):
+        # Раздача берется из уже готовой очереди, решатель здесь не вызывается
+        try:
+            seed, deal = self.buckets[difficulty].popleft()
+        except (KeyError, IndexError):
+            return None
+        finally:
+            self.wakeup.set()
+        return Game_Solitaire(seed, deal)
+
+    def sizes(self):
+        return {difficulty: len(bucket) for difficulty, bucket in self.buckets.items()}
+
+    def bucket_for(self, nodes):
+        for difficulty, (low, high) in dealbank.DIFFICULTY_RANGES.items():
+            if low <= nodes <= high:
+                return difficulty
+        return None
+
+    def missing(self):
+        return [difficulty for difficulty, bucket in self.buckets.items() if len(bucket) < self.target]
+
+    def fill_from_bank(self):
+        # Возвращает уровни, для которых в банке нет подходящих раздач
+        missing = self.missing()
+        if not self.bank_path or not os.path.exists(self.bank_path):
+            return missing
+        empty = []
+        try:
+            with dealbank.DealBank(self.bank_path) as bank:
+                for difficulty in missing:
+                    low, high = dealbank.DIFFICULTY_RANGES[difficulty]
+                    numbers = bank.matching(dealbank.STATUS_WIN, low, high)
+                    if not numbers:
+                        empty.append(difficulty)
+                        continue
+                    bucket = self.buckets[difficulty]
+                    for number in self.rng.sample(numbers, min(len(numbers), self.target - len(bucket))):
+                        record = bank.record(number)
+                        bucket.append((record['seed'], record['deal']))
+        except (OSError, ValueError) as e:
+            print(f"Не удалось прочитать банк раздач: {e}")
+            return self.missing()
+        return empty
+
+    def run(self):
+        # Модули для процессов загружаются в фоновом потоке, а не при старте игры
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        try:
+            while not self.stopped:
+                if not self.missing():
+                    self.wakeup.wait()
+                    self.wakeup.clear()
+                    continue
+                # Сначала банк; случайные раздачи решаются, только если в банке нет нужного уровня
+                if not self.fill_from_bank():
+                    continue
+                if self.executor is None:
+                    # Решатель работает в отдельном процессе, чтобы не занимать GIL интерфейса
+                    self.executor = ProcessPoolExecutor(
+                        self.workers, mp_context=multiprocessing.get_context('spawn')
+                    )
+                seeds = [self.rng.randrange(dealbank.NO_SEED) for _ in range(self.workers)]
+                tasks = [(seed, self.node_limit, self.time_limit) for seed in seeds]
+                for result in self.executor.map(solver.analyze_seed, tasks):
+                    if result['result'] != solver.WIN:
+                        continue
+                    difficulty = self.bucket_for(result['nodes'])
+                    if difficulty and len(self.buckets[difficulty]) < self.target:
+                        self.buckets[difficulty].append((result['seed'], Game_Solitaire(result['seed']).deal))
+        except Exception as e:
+            if not self.stopped:
+                print(f"Пополнение раздач остановлено: {e}")
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stop(self):
+        self.stopped = True
+        self.wakeup.set()
@@ -1,31 +1,119 @@
 import random
 
+import perf
+
+SUITS = ('♠', '♥', '♦', '♣')
+RANKS = ('A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K')
+RANK_VALUES = {rank: value for value, rank in enumerate(RANKS, 1)}
+
+# Код карты 0–51: масть * 13 + (достоинство - 1)
+CARD_SUIT = tuple(code // 13 for code in range(52))
+CARD_VALUE = tuple(code % 13 + 1 for code in range(52))
+CARD_RED = tuple(SUITS[code // 13] in ('♥', '♦') for code in range(52))
+# Масти противоположного цвета для ♠, ♥, ♦, ♣
+OPPOSITE_SUITS = ((1, 2), (0, 3), (0, 3), (1, 2))
+
+# Ходы — кортежи, первый элемент которых задает вид хода:
+# (DRAW,), (WASTE_TO_TABLEAU, стопка), (WASTE_TO_FOUNDATION, фундамент),
+# (TABLEAU_TO_TABLEAU, откуда, индекс карты, куда), (TABLEAU_TO_FOUNDATION, откуда, фундамент)
+DRAW = 'draw'
+WASTE_TO_TABLEAU = 'waste_tableau'
+WASTE_TO_FOUNDATION = 'waste_foundation'
+TABLEAU_TO_TABLEAU = 'tableau_tableau'
+TABLEAU_TO_FOUNDATION = 'tableau_foundation'
+
+# Где лежит карта: (область, номер стопки или фундамента, позиция)
+IN_DECK = 'deck'
+IN_WASTE = 'waste'
+IN_FOUNDATION = 'foundation'
+IN_TABLEAU = 'tableau'
+
+# Случайные ключи Zobrist. Стопки хешируются парами «карта — карта под ней»,
+# поэтому перестановка стопок не меняет хеш; фундаменты — множеством карт.
+# Колода и сброс образуют одну цепочку deck + reversed(waste) с указателем
+# len(deck): взятие карты и новый круг колоды меняют только указатель.
+_zobrist_rng = random.Random(0x5D1C0A7E)
+ZOBRIST_TABLEAU = tuple(_zobrist_rng.getrandbits(64) for _ in range(52 * 53 * 2))
+ZOBRIST_FOUNDATION = tuple(_zobrist_rng.getrandbits(64) for _ in range(52))
+ZOBRIST_TALON = tuple(_zobrist_rng.getrandbits(64) for _ in range(53 * 53))
+ZOBRIST_STOCK = tuple(_zobrist_rng.getrandbits(64) for _ in range(53))
+
+
+def tableau_key(code, below, face_up):
+    return ZOBRIST_TABLEAU[(code * 53 + below + 1) * 2 + face_up]
+
+
+def talon_key(previous, following):
+    return ZOBRIST_TALON[(previous + 1) * 53 + following + 1]
+
+
 class Card:
+    __slots__ = ('suit', 'rank', 'value', 'suit_index', 'code', 'red', 'color', 'face_up')
+
     def __init__(self, suit, rank):
         self.suit = suit  # Масть: ♠, ♥, ♦, ♣
         self.rank = rank  # Достоинство: A, 2-10, J, Q, K
+        self.value = RANK_VALUES[rank]  # Достоинство числом: 1-13
+        self.suit_index = SUITS.index(suit)
+        self.code = self.suit_index * 13 + self.value - 1
+        self.red = CARD_RED[self.code]
+        self.color = 'red' if self.red else 'black'
         self.face_up = False  # Перевернута ли карта
-        self.color = 'red' if suit in ['♥', '♦'] else 'black'
-    
+
     def __repr__(self):
         return f"{self.rank}{self.suit}"
 
+
+def card_from_code(code):
+    return Card(SUITS[code // 13], RANKS[code % 13])
+
+
 class Game_Solitaire:
-    def __init__(self):
+    def __init__(self, seed=None, deal=None, state=None):
+        self.seed = seed
+        self.rng = random.Random(seed)
         self.deck = []
         self.waste = []
         self.foundations = [[], [], [], []]
         self.tableau = [[] for _ in range(7)]
-        
-        self.init_game()
-    
-    def init_game(self):
-        suits = ['♠', '♥', '♦', '♣']
-        ranks = ['A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K']
-        
-        self.deck = [Card(suit, rank) for suit in suits for rank in ranks]
+        self.history = []
+        self.redo_stack = []
+        self.zobrist = 0
+        self.deal = b''
+
+        # Производные индексы, обновляются вместе с ходами
+        self.heights = [0, 0, 0, 0]
+        self.suit_foundation = [None, None, None, None]
+        self.foundation_total = 0
+        self.hidden = [0] * 7
+        self.location = [None] * 52
+        self.empty_column = None
+        self.foundation_moves = [None] * 7
+        self.waste_foundation_move = None
+        self.column_moves = [[] for _ in range(7)]
+        self.waste_moves = []
+        self.moves_cache = None
+        self.dirty_columns = set()
+        self.dirty_waste = False
+        self.dirty_foundations = False
 
-        random.shuffle(self.deck)
+        if state is None:
+            self.init_game(deal)
+        else:
+            self.unpack(state)
+
+    @classmethod
+    def from_packed(cls, state):
+        return cls(state=state)
+
+    def init_game(self, deal=None):
+        # deal — порядок колоды после тасовки в виде кодов карт 0–51
+        if deal is None:
+            self.deck = [Card(suit, rank) for suit in SUITS for rank in RANKS]
+            self.rng.shuffle(self.deck)
+        else:
+            self.deck = [Card(SUITS[code // 13], RANKS[code % 13]) for code in deal]
+        self.deal = bytes(card.code for card in self.deck)
 
         for i in range(7):
             for j in range(i + 1):
@@ -36,35 +124,124 @@ class Game_Solitaire:
 
         for card in self.deck:
             card.face_up = False
-    
+
+        self.zobrist = self.compute_zobrist()
+        self.rebuild_indexes()
+
+    def unpack(self, state):
+        # Карты создаются заново: позиция не делит с другими партиями изменяемых объектов
+        for i, top in enumerate(state.foundations):
+            if top:
+                suit = (top - 1) // 13
+                self.foundations[i] = [card_from_code(suit * 13 + value) for value in range(top - suit * 13)]
+                for card in self.foundations[i]:
+                    card.face_up = True
+        for i, codes in enumerate(state.columns):
+            column = self.tableau[i]
+            for index, code in enumerate(codes):
+                card = card_from_code(code)
+                card.face_up = index >= state.hidden[i]
+                column.append(card)
+        self.deck = [card_from_code(code) for code in state.talon[:state.stock]]
+        self.waste = [card_from_code(code) for code in reversed(state.talon[state.stock:])]
+        for card in self.waste:
+            card.face_up = True
+
+        self.zobrist = self.compute_zobrist()
+        self.rebuild_indexes()
+
+    def pack(self):
+        return PackedState(
+            tuple(bytes(card.code for card in column) for column in self.tableau),
+            bytes(self.hidden),
+            bytes(f[-1].code + 1 if f else 0 for f in self.foundations),
+            bytes([card.code for card in self.deck] + [card.code for card in reversed(self.waste)]),
+            len(self.deck),
+        )
+
+    def rebuild_indexes(self):
+        self.heights = [0, 0, 0, 0]
+        self.suit_foundation = [None, None, None, None]
+        self.foundation_total = 0
+        for i, foundation in enumerate(self.foundations):
+            if foundation:
+                suit = foundation[-1].suit_index
+                self.heights[suit] = foundation[-1].value
+                self.suit_foundation[suit] = i
+                self.foundation_total += len(foundation)
+            for index, card in enumerate(foundation):
+                self.location[card.code] = (IN_FOUNDATION, i, index)
+
+        for i, column in enumerate(self.tableau):
+            self.hidden[i] = sum(not card.face_up for card in column)
+            for index, card in enumerate(column):
+                self.location[card.code] = (IN_TABLEAU, i, index)
+        self.locate_talon()
+
+        self.empty_column = self.first_empty_column()
+        for i in range(7):
+            self.foundation_moves[i] = self.column_foundation_move(i)
+            self.column_moves[i] = self.column_tableau_moves(i, range(7))
+        self.waste_foundation_move = self.find_waste_foundation_move()
+        self.waste_moves = self.waste_tableau_moves()
+        self.moves_cache = None
+        self.dirty_columns = set()
+        self.dirty_waste = False
+        self.dirty_foundations = False
+
+    def locate_talon(self):
+        for index, card in enumerate(self.deck):
+            self.location[card.code] = (IN_DECK, None, index)
+        for index, card in enumerate(self.waste):
+            self.location[card.code] = (IN_WASTE, None, index)
+
+    def locate(self, code):
+        return self.location[code]
+
+    def compute_zobrist(self):
+        result = 0
+        for column in self.tableau:
+            below = -1
+            for card in column:
+                result ^= tableau_key(card.code, below, card.face_up)
+                below = card.code
+
+        for foundation in self.foundations:
+            for card in foundation:
+                result ^= ZOBRIST_FOUNDATION[card.code]
+
+        previous = -1
+        for card in self.deck + self.waste[::-1]:
+            result ^= talon_key(previous, card.code)
+            previous = card.code
+        result ^= talon_key(previous, -1)
+        return result ^ ZOBRIST_STOCK[len(self.deck)]
+
+    def canonical_key(self):
+        # Точный ключ без коллизий: для проверки хеша и отладки
+        columns = tuple(sorted(
+            tuple((card.code, card.face_up) for card in column) for column in self.tableau
+        ))
+        foundations = tuple(sorted(tuple(card.code for card in f) for f in self.foundations))
+        return (
+            columns,
+            foundations,
+            tuple(card.code for card in self.deck),
+            tuple(card.code for card in self.waste),
+        )
+
     def can_move_to_foundation(self, card, foundation):
         if not foundation:
-            return card.rank == 'A'
+            return card.value == 1
 
         top_card = foundation[-1]
+        return card.suit_index == top_card.suit_index and card.value == top_card.value + 1
 
-        if card.suit != top_card.suit:
-
-            return False
-
-        ranks = ['A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K']
-        current_index = ranks.index(top_card.rank)
-        next_index = ranks.index(card.rank)
-        
-        return next_index == current_index + 1
-    
     def game_stopka(self, card, target_card):
         if not target_card.face_up:
             return False
 
-        if card.color == target_card.color:
-            return False
-
-        ranks = ['A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K']
-        target_index = ranks.index(target_card.rank)
-        card_index = ranks.index(card.rank)
-        
-        return card_index == target_index - 1
+        return card.red != target_card.red and card.value == target_card.value - 1
     
     def sequence(self, cards, target_card):
         if not cards:
@@ -72,3 +249,510 @@ class Game_Solitaire:
 
         return self.game_stopka(cards[0], target_card)
 
+    def is_valid_sequence(self, cards):
+        for upper, lower in zip(cards, cards[1:]):
+            if upper.red == lower.red or lower.value != upper.value - 1:
+                return False
+        return True
+
+    def is_won(self):
+        return self.foundation_total == 52
+
+    def has_moves(self):
+        # Пока есть колода или сброс, взять карту можно всегда
+        return bool(self.deck or self.waste) or bool(self.legal_moves())
+
+    def find_foundation(self, card):
+        if self.heights[card.suit_index] != card.value - 1:
+            return None
+        if card.value > 1:
+            return self.suit_foundation[card.suit_index]
+        return next((i for i, foundation in enumerate(self.foundations) if not foundation), None)
+
+    def first_empty_column(self):
+        return next((i for i, column in enumerate(self.tableau) if not column), None)
+
+    def is_safe_for_foundation(self, card):
+        # Карту можно убрать без потерь, если на нее уже некому ложиться:
+        # все карты противоположного цвета на ранг ниже уже в фундаментах
+        if card.value <= 2:
+            return True
+        first, second = OPPOSITE_SUITS[card.suit_index]
+        return self.heights[first] >= card.value - 1 and self.heights[second] >= card.value - 1
+
+    def can_autocomplete(self):
+        # Колода и сброс пусты, все карты открыты: каждая стопка — готовая последовательность,
+        # и младшая из оставшихся карт всегда лежит сверху, так что партия доигрывается ходами в фундаменты
+        return not self.deck and not self.waste and not any(self.hidden) and not self.is_won()
+
+    def next_foundation_move(self, safe_only=True):
+        for i, column in enumerate(self.tableau):
+            if column and column[-1].face_up and (not safe_only or self.is_safe_for_foundation(column[-1])):
+                foundation = self.find_foundation(column[-1])
+                if foundation is not None:
+                    return (TABLEAU_TO_FOUNDATION, i, foundation)
+        if self.waste and (not safe_only or self.is_safe_for_foundation(self.waste[-1])):
+            foundation = self.find_foundation(self.waste[-1])
+            if foundation is not None:
+                return (WASTE_TO_FOUNDATION, foundation)
+        return None
+
+    def autoplay(self, safe_only=True):
+        # Ходы в фундаменты выполняются подряд, пока находятся; каждый попадает в историю
+        moves = []
+        move = self.next_foundation_move(safe_only)
+        while move is not None:
+            self.apply_move(move)
+            moves.append(move)
+            move = self.next_foundation_move(safe_only)
+        return moves
+
+    def autocomplete(self):
+        if not self.can_autocomplete():
+            return []
+        return self.autoplay(safe_only=False)
+
+    def push_foundation(self, index, card):
+        self.foundations[index].append(card)
+        self.heights[card.suit_index] = card.value
+        self.suit_foundation[card.suit_index] = index
+        self.foundation_total += 1
+        self.location[card.code] = (IN_FOUNDATION, index, card.value - 1)
+
+    def pop_foundation(self, index):
+        card = self.foundations[index].pop()
+        self.heights[card.suit_index] = card.value - 1
+        if card.value == 1:
+            self.suit_foundation[card.suit_index] = None
+        self.foundation_total -= 1
+        return card
+
+    def push_tableau(self, column, cards):
+        target = self.tableau[column]
+        for card in cards:
+            self.location[card.code] = (IN_TABLEAU, column, len(target))
+            target.append(card)
+
+    def can_place_on_tableau(self, card, column):
+        target = self.tableau[column]
+        if not target:
+            return card.value == 13
+        return self.game_stopka(card, target[-1])
+
+    def is_legal(self, move):
+        kind = move[0]
+        if kind == DRAW:
+            return bool(self.deck or self.waste)
+        if kind == WASTE_TO_TABLEAU:
+            return bool(self.waste) and self.can_place_on_tableau(self.waste[-1], move[1])
+        if kind == WASTE_TO_FOUNDATION:
+            return bool(self.waste) and self.can_move_to_foundation(self.waste[-1], self.foundations[move[1]])
+        if kind == TABLEAU_TO_TABLEAU:
+            source, index, target = move[1], move[2], move[3]
+            column = self.tableau[source]
+            if source == target or not 0 <= index < len(column) or not column[index].face_up:
+                return False
+            cards = column[index:]
+            return self.is_valid_sequence(cards) and self.can_place_on_tableau(cards[0], target)
+        if kind == TABLEAU_TO_FOUNDATION:
+            column = self.tableau[move[1]]
+            return (bool(column) and column[-1].face_up and
+                    self.can_move_to_foundation(column[-1], self.foundations[move[2]]))
+        return False
+
+    def column_foundation_move(self, column):
+        cards = self.tableau[column]
+        if cards and cards[-1].face_up:
+            foundation = self.find_foundation(cards[-1])
+            if foundation is not None:
+                return (TABLEAU_TO_FOUNDATION, column, foundation)
+        return None
+
+    def find_waste_foundation_move(self):
+        if self.waste:
+            foundation = self.find_foundation(self.waste[-1])
+            if foundation is not None:
+                return (WASTE_TO_FOUNDATION, foundation)
+        return None
+
+    def sequence_start(self, column):
+        # Начало последовательности, которую можно перенести с верха стопки целиком
+        cards = self.tableau[column]
+        hidden = self.hidden[column]
+        start = len(cards) - 1
+        while start > hidden:
+            upper, lower = cards[start - 1], cards[start]
+            if upper.red == lower.red or lower.value != upper.value - 1:
+                break
+            start -= 1
+        return start
+
+    def column_tableau_moves(self, source, targets):
+        # Переносимая часть стопки — убывающая последовательность, поэтому на каждую цель
+        # может лечь только одна ее карта, и позиция этой карты определяется по достоинству.
+        # Равнозначные цели не дублируются: король идет только в первую пустую стопку
+        column = self.tableau[source]
+        if len(column) == self.hidden[source]:
+            return []
+        last = len(column) - 1
+        start = self.sequence_start(source)
+        top_value = column[last].value
+
+        moves = []
+        for target in targets:
+            if target == source:
+                continue
+            cards = self.tableau[target]
+            if not cards:
+                if target == self.empty_column and column[start].value == 13:
+                    moves.append((TABLEAU_TO_TABLEAU, source, start, target))
+                continue
+            target_card = cards[-1]
+            index = last - (target_card.value - 1 - top_value)
+            if start <= index <= last and self.game_stopka(column[index], target_card):
+                moves.append((TABLEAU_TO_TABLEAU, source, index, target))
+        if len(moves) > 1:
+            moves.sort(key=lambda move: (-move[2], move[3]))
+        return moves
+
+    def waste_tableau_moves(self):
+        moves = []
+        if self.waste:
+            card = self.waste[-1]
+            for target in range(7):
+                if not self.tableau[target]:
+                    if target == self.empty_column and card.value == 13:
+                        moves.append((WASTE_TO_TABLEAU, target))
+                elif self.game_stopka(card, self.tableau[target][-1]):
+                    moves.append((WASTE_TO_TABLEAU, target))
+        return moves
+
+    def mark_changed(self, columns, waste_changed, foundations_changed):
+        # Ход только отмечает изменения, ходы пересчитываются при следующем запросе:
+        # при поиске с откатами несколько ходов подряд обходятся одним пересчетом
+        self.moves_cache = None
+        self.dirty_columns.update(columns)
+        self.dirty_waste = self.dirty_waste or waste_changed
+        self.dirty_foundations = self.dirty_foundations or foundations_changed
+
+    def update_moves(self):
+        # Пересчитываются только ходы, затронутые изменившимися стопками, сбросом и фундаментами
+        columns = self.dirty_columns
+        waste_changed = self.dirty_waste
+        foundations_changed = self.dirty_foundations
+        self.dirty_columns = set()
+        self.dirty_waste = self.dirty_foundations = False
+
+        targets = set(columns)
+        empty_column = self.first_empty_column()
+        if empty_column != self.empty_column:
+            targets.update(i for i in (self.empty_column, empty_column) if i is not None)
+            self.empty_column = empty_column
+
+        if targets:
+            ordered = sorted(targets)
+            for source in range(7):
+                if source in columns:
+                    self.column_moves[source] = self.column_tableau_moves(source, range(7))
+                else:
+                    kept = [move for move in self.column_moves[source] if move[3] not in targets]
+                    added = self.column_tableau_moves(source, ordered)
+                    if added:
+                        kept.extend(added)
+                        kept.sort(key=lambda move: (-move[2], move[3]))
+                    self.column_moves[source] = kept
+        if targets or waste_changed:
+            self.waste_moves = self.waste_tableau_moves()
+
+        if foundations_changed:
+            for i in range(7):
+                self.foundation_moves[i] = self.column_foundation_move(i)
+        else:
+            for i in columns:
+                self.foundation_moves[i] = self.column_foundation_move(i)
+        if foundations_changed or waste_changed:
+            self.waste_foundation_move = self.find_waste_foundation_move()
+
+    @perf.timed('engine.legal_moves')
+    def legal_moves(self):
+        # Список общий до следующего хода, вызывающий его не меняет
+        if self.moves_cache is None:
+            self.update_moves()
+            moves = [move for move in self.foundation_moves if move]
+            if self.waste_foundation_move:
+                moves.append(self.waste_foundation_move)
+            for column_moves in self.column_moves:
+                moves.extend(column_moves)
+            moves.extend(self.waste_moves)
+            if self.deck or self.waste:
+                moves.append((DRAW,))
+            self.moves_cache = moves
+        return self.moves_cache
+
+    @perf.timed('engine.apply_move')
+    def apply_move(self, move):
+        if not self.is_legal(move):
+            return False
+        if self.redo_stack:
+            self.redo_stack.clear()
+        self.play(move)
+        return True
+
+    def redo_move(self):
+        if not self.redo_stack:
+            return None
+        move = self.redo_stack.pop()
+        self.play(move)
+        return move
+
+    def moves_played(self):
+        return [entry[0] for entry in self.history]
+
+    def play(self, move):
+        kind = move[0]
+        previous_hash = self.zobrist
+        if kind == DRAW:
+            recycled = not self.deck
+            self.zobrist ^= ZOBRIST_STOCK[len(self.deck)]
+            if recycled:
+                self.deck.extend(reversed(self.waste))
+                self.waste.clear()
+                for card in self.deck:
+                    card.face_up = False
+                self.locate_talon()
+            card = self.deck.pop()
+            card.face_up = True
+            self.location[card.code] = (IN_WASTE, None, len(self.waste))
+            self.waste.append(card)
+            self.zobrist ^= ZOBRIST_STOCK[len(self.deck)]
+            self.history.append((move, recycled, 1, previous_hash))
+            self.mark_changed((), True, False)
+        elif kind == WASTE_TO_TABLEAU:
+            target = self.tableau[move[1]]
+            card = self.waste[-1]
+            self.zobrist ^= self.waste_removal_key() ^ tableau_key(
+                card.code, target[-1].code if target else -1, True)
+            self.push_tableau(move[1], (self.waste.pop(),))
+            self.history.append((move, False, 1, previous_hash))
+            self.mark_changed((move[1],), True, False)
+        elif kind == WASTE_TO_FOUNDATION:
+            self.zobrist ^= self.waste_removal_key() ^ ZOBRIST_FOUNDATION[self.waste[-1].code]
+            self.push_foundation(move[1], self.waste.pop())
+            self.history.append((move, False, 1, previous_hash))
+            self.mark_changed((), True, True)
+        elif kind == TABLEAU_TO_TABLEAU:
+            source, index, target = move[1], move[2], move[3]
+            column = self.tableau[source]
+            count = len(column) - index
+            card = column[index]
+            self.zobrist ^= tableau_key(card.code, column[index - 1].code if index else -1, True)
+            self.zobrist ^= tableau_key(
+                card.code, self.tableau[target][-1].code if self.tableau[target] else -1, True)
+            self.push_tableau(target, column[index:])
+            del column[index:]
+            self.history.append((move, self.flip_top(source), count, previous_hash))
+            self.mark_changed((source, target), False, False)
+        else:
+            column = self.tableau[move[1]]
+            card = column[-1]
+            self.zobrist ^= tableau_key(card.code, column[-2].code if len(column) > 1 else -1, True)
+            self.zobrist ^= ZOBRIST_FOUNDATION[card.code]
+            self.push_foundation(move[2], column.pop())
+            self.history.append((move, self.flip_top(move[1]), 1, previous_hash))
+            self.mark_changed((move[1],), False, True)
+
+    @perf.timed('engine.undo_move')
+    def undo_move(self):
+        if not self.history:
+            return None
+
+        move, flag, count, self.zobrist = self.history.pop()
+        kind = move[0]
+        if kind == DRAW:
+            card = self.waste.pop()
+            card.face_up = False
+            self.location[card.code] = (IN_DECK, None, len(self.deck))
+            self.deck.append(card)
+            if flag:
+                for card in self.deck:
+                    card.face_up = True
+                self.waste.extend(reversed(self.deck))
+                self.deck.clear()
+                self.locate_talon()
+            self.mark_changed((), True, False)
+        elif kind == WASTE_TO_TABLEAU:
+            card = self.tableau[move[1]].pop()
+            self.location[card.code] = (IN_WASTE, None, len(self.waste))
+            self.waste.append(card)
+            self.mark_changed((move[1],), True, False)
+        elif kind == WASTE_TO_FOUNDATION:
+            card = self.pop_foundation(move[1])
+            self.location[card.code] = (IN_WASTE, None, len(self.waste))
+            self.waste.append(card)
+            self.mark_changed((), True, True)
+        elif kind == TABLEAU_TO_TABLEAU:
+            source, target = move[1], move[3]
+            if flag:
+                self.tableau[source][-1].face_up = False
+                self.hidden[source] += 1
+            column = self.tableau[target]
+            self.push_tableau(source, column[-count:])
+            del column[-count:]
+            self.mark_changed((source, target), False, False)
+        else:
+            if flag:
+                self.tableau[move[1]][-1].face_up = False
+                self.hidden[move[1]] += 1
+            self.push_tableau(move[1], (self.pop_foundation(move[2]),))
+            self.mark_changed((move[1],), False, True)
+        self.redo_stack.append(move)
+        return move
+
+    def flip_top(self, column):
+        cards = self.tableau[column]
+        if cards and not cards[-1].face_up:
+            cards[-1].face_up = True
+            self.hidden[column] -= 1
+            below = cards[-2].code if len(cards) > 1 else -1
+            self.zobrist ^= tableau_key(cards[-1].code, below, False) ^ tableau_key(cards[-1].code, below, True)
+            return True
+        return False
+
+    def waste_removal_key(self):
+        # Верх сброса стоит в цепочке сразу за верхом колоды
+        code = self.waste[-1].code
+        previous = self.deck[-1].code if self.deck else -1
+        following = self.waste[-2].code if len(self.waste) > 1 else -1
+        return talon_key(previous, code) ^ talon_key(code, following) ^ talon_key(previous, following)
+
+
+def replaced(items, changes):
+    items = list(items)
+    for index, value in changes.items():
+        items[index] = value
+    return tuple(items)
+
+
+class PackedState:
+    # Неизменяемая позиция без объектов Card: стопки — байты кодов снизу вверх и число закрытых карт,
+    # фундаменты — код верхней карты + 1, колода и сброс — одна цепочка deck + reversed(waste),
+    # где stock — длина колоды. Дочерняя позиция копирует только затронутые ходом стопки
+    __slots__ = ('columns', 'hidden', 'foundations', 'talon', 'stock')
+
+    def __init__(self, columns, hidden, foundations, talon, stock):
+        self.columns = columns
+        self.hidden = hidden
+        self.foundations = foundations
+        self.talon = talon
+        self.stock = stock
+
+    def key(self):
+        return (self.columns, self.hidden, self.foundations, self.talon, self.stock)
+
+    def __eq__(self, other):
+        return isinstance(other, PackedState) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def heights(self):
+        heights = [0, 0, 0, 0]
+        for top in self.foundations:
+            if top:
+                heights[(top - 1) // 13] = (top - 1) % 13 + 1
+        return heights
+
+    def is_won(self):
+        return sum(self.heights()) == 52
+
+    def waste_top(self):
+        return self.talon[self.stock] if self.stock < len(self.talon) else None
+
+    def find_foundation(self, code, heights):
+        suit, value = CARD_SUIT[code], CARD_VALUE[code]
+        if heights[suit] != value - 1:
+            return None
+        for i, top in enumerate(self.foundations):
+            if (top and (top - 1) // 13 == suit) if value > 1 else not top:
+                return i
+        return None
+
+    def fits(self, code, target):
+        column = self.columns[target]
+        if not column:
+            return False
+        top = column[-1]
+        return CARD_RED[code] != CARD_RED[top] and CARD_VALUE[code] == CARD_VALUE[top] - 1
+
+    def legal_moves(self):
+        # Тот же набор и порядок ходов, что у Game_Solitaire.legal_moves
+        heights = self.heights()
+        columns = self.columns
+        empty_column = next((i for i, column in enumerate(columns) if not column), None)
+        moves = []
+        for i, column in enumerate(columns):
+            if len(column) > self.hidden[i]:
+                foundation = self.find_foundation(column[-1], heights)
+                if foundation is not None:
+                    moves.append((TABLEAU_TO_FOUNDATION, i, foundation))
+        waste = self.waste_top()
+        if waste is not None:
+            foundation = self.find_foundation(waste, heights)
+            if foundation is not None:
+                moves.append((WASTE_TO_FOUNDATION, foundation))
+
+        for source, column in enumerate(columns):
+            for index in range(len(column) - 1, self.hidden[source] - 1, -1):
+                code = column[index]
+                if index < len(column) - 1:
+                    upper = column[index + 1]
+                    if CARD_RED[upper] == CARD_RED[code] or CARD_VALUE[upper] != CARD_VALUE[code] - 1:
+                        break
+                for target in range(7):
+                    if target == source:
+                        continue
+                    if target == empty_column and CARD_VALUE[code] == 13 or self.fits(code, target):
+                        moves.append((TABLEAU_TO_TABLEAU, source, index, target))
+
+        if waste is not None:
+            for target in range(7):
+                if target == empty_column and CARD_VALUE[waste] == 13 or self.fits(waste, target):
+                    moves.append((WASTE_TO_TABLEAU, target))
+        if self.talon:
+            moves.append((DRAW,))
+        return moves
+
+    def remove_from_column(self, column, index):
+        # Если сверху осталась закрытая карта, она открывается
+        hidden = self.hidden
+        if 0 < index == hidden[column]:
+            hidden = bytes(replaced(hidden, {column: index - 1}))
+        return self.columns[column][:index], hidden
+
+    def child(self, move):
+        # Ход считается допустимым, как в Game_Solitaire.play
+        kind = move[0]
+        columns, hidden, foundations, talon, stock = self.key()
+        if kind == DRAW:
+            if stock == 0:
+                stock = len(talon)
+            return PackedState(columns, hidden, foundations, talon, stock - 1)
+        if kind in (WASTE_TO_TABLEAU, WASTE_TO_FOUNDATION):
+            code = talon[stock]
+            talon = talon[:stock] + talon[stock + 1:]
+            if kind == WASTE_TO_TABLEAU:
+                columns = replaced(columns, {move[1]: columns[move[1]] + bytes((code,))})
+            else:
+                foundations = bytes(replaced(foundations, {move[1]: code + 1}))
+            return PackedState(columns, hidden, foundations, talon, stock)
+        if kind == TABLEAU_TO_TABLEAU:
+            source, index, target = move[1], move[2], move[3]
+            remaining, hidden = self.remove_from_column(source, index)
+            columns = replaced(columns, {source: remaining, target: columns[target] + columns[source][index:]})
+            return PackedState(columns, hidden, foundations, talon, stock)
+        source = move[1]
+        code = columns[source][-1]
+        remaining, hidden = self.remove_from_column(source, len(columns[source]) - 1)
+        columns = replaced(columns, {source: remaining})
+        foundations = bytes(replaced(foundations, {move[2]: code + 1}))
+        return PackedState(columns, hidden, foundations, talon, stock)
@@ -0,0 +1,170 @@
+import argparse
+import time
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError as e:
+    NUMPY_AVAILABLE = False
+    print(f"numpy недоступен: {e}")
+
+from logic import Game_Solitaire, CARD_SUIT, CARD_VALUE, CARD_RED
+import dealbank
+
+# Раскладка повторяет Game_Solitaire.init_game: карты берутся с конца колоды,
+# стопка i получает i + 1 карту, верхняя открыта; первые 24 карты остаются в колоде
+TABLEAU_START = [i * (i + 1) // 2 for i in range(7)]
+TOP_POSITIONS = [51 - TABLEAU_START[i] - i for i in range(7)]
+HIDDEN_POSITIONS = [51 - TABLEAU_START[i] - j for i in range(7) for j in range(i)]
+STOCK_SIZE = 24
+
+if NUMPY_AVAILABLE:
+    CARD_VALUES = np.array(CARD_VALUE, dtype=np.int8)
+    CARD_SUITS = np.array(CARD_SUIT, dtype=np.int8)
+    CARD_REDS = np.array(CARD_RED, dtype=bool)
+
+METRICS = ('exposed_aces', 'buried_aces', 'ace_depth', 'stock_aces',
+           'tableau_moves', 'foundation_moves')
+
+
+def random_deals(count, seed=None):
+    rng = np.random.default_rng(seed)
+    # Перестановка каждой строки через сортировку случайных ключей
+    return rng.random((count, 52), dtype=np.float32).argsort(axis=1).astype(np.uint8)
+
+
+def seeded_deals(seeds):
+    # Те же раздачи, что получит игра с этими номерами
+    return np.array([list(Game_Solitaire(seed).deal) for seed in seeds], dtype=np.uint8).reshape(-1, 52)
+
+
+def bank_deals(path):
+    data = np.memmap(path, dtype=np.uint8, mode='r')
+    return data[:len(data) // 52 * 52].reshape(-1, 52) & dealbank.CARD_MASK
+
+
+def foundation_chain(deals, values, suits):
+    # Сколько карт уходит в фундаменты подряд только с верхушек стопок, без других ходов.
+    # На каждом шаге обрабатываются только раздачи, где предыдущий шаг что-то сдвинул
+    moves = np.zeros(len(deals), dtype=np.int16)
+    active = np.arange(len(deals))
+    remaining = np.tile(np.arange(1, 8, dtype=np.int8), (len(deals), 1))
+    heights = np.zeros((len(deals), 4), dtype=np.int8)
+    start = np.array(TABLEAU_START)
+
+    while len(active):
+        rows = np.arange(len(active))[:, None]
+        positions = 51 - start - np.maximum(remaining - 1, 0)
+        top_values = values[active[:, None], positions]
+        top_suits = suits[active[:, None], positions]
+        playable = (remaining > 0) & (top_values == heights[rows, top_suits] + 1)
+
+        # В одной раздаче подходящая карта каждой масти единственна, записи не пересекаются
+        deal_index, column = np.nonzero(playable)
+        heights[deal_index, top_suits[deal_index, column]] = top_values[deal_index, column]
+        remaining -= playable
+        moved = playable.sum(axis=1, dtype=np.int16)
+        moves[active] += moved
+
+        keep = moved > 0
+        active = active[keep]
+        remaining = remaining[keep]
+        heights = heights[keep]
+    return moves
+
+
+def deal_metrics(deals):
+    deals = np.asarray(deals, dtype=np.uint8)
+    values = CARD_VALUES[deals]
+    suits = CARD_SUITS[deals]
+    red = CARD_REDS[deals]
+
+    aces = values == 1
+    top_values = values[:, TOP_POSITIONS]
+    top_red = red[:, TOP_POSITIONS]
+
+    # Глубина туза — число карт, лежащих на нем в стопке
+    depth = np.zeros(52, dtype=np.int8)
+    for i in range(7):
+        for j in range(i + 1):
+            depth[51 - TABLEAU_START[i] - j] = i - j
+    depth[:STOCK_SIZE] = 0
+
+    # Ход между стопками: карта на ранг ниже и другого цвета
+    fits = ((top_values[:, :, None] == top_values[:, None, :] - 1) &
+            (top_red[:, :, None] != top_red[:, None, :]))
+
+    return {
+        'exposed_aces': aces[:, TOP_POSITIONS].sum(axis=1),
+        'buried_aces': aces[:, HIDDEN_POSITIONS].sum(axis=1),
+        'ace_depth': (aces * depth).sum(axis=1),
+        'stock_aces': aces[:, :STOCK_SIZE].sum(axis=1),
+        'tableau_moves': fits.sum(axis=(1, 2)),
+        'foundation_moves': foundation_chain(deals, values, suits),
+    }
+
+
+def accumulate(totals, metrics):
+    for name in METRICS:
+        counts = np.bincount(metrics[name].astype(np.int64))
+        if name not in totals:
+            totals[name] = counts
+        else:
+            size = max(len(totals[name]), len(counts))
+            totals[name] = (np.pad(totals[name], (0, size - len(totals[name]))) +
+                            np.pad(counts, (0, size - len(counts))))
+    return totals
+
+
+def run(count, seed=None, batch_size=1000000):
+    rng = np.random.default_rng(seed)
+    totals = {}
+    done = 0
+    started = time.perf_counter()
+    while done < count:
+        size = min(batch_size, count - done)
+        accumulate(totals, deal_metrics(random_deals(size, rng)))
+        done += size
+    return totals, time.perf_counter() - started
+
+
+def describe(totals):
+    lines = []
+    for name in METRICS:
+        counts = totals[name]
+        total = counts.sum()
+        mean = (counts * np.arange(len(counts))).sum() / total
+        shares = ", ".join(f"{value}: {share:.1%}" for value, share in enumerate(counts / total) if share >= 0.001)
+        lines.append(f"{name}: среднее {mean:.3f}; {shares}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Статистика начальных раскладов по большому числу раздач")
+    parser.add_argument('-n', '--deals', type=int, default=1000000, help="количество случайных раздач")
+    parser.add_argument('--seed', type=int, default=None, help="начальное значение генератора")
+    parser.add_argument('--batch', type=int, default=1000000, help="раздач в одном пакете")
+    parser.add_argument('--bank', default=None, help="считать по банку раздач вместо случайных")
+    args = parser.parse_args()
+
+    if not NUMPY_AVAILABLE:
+        print("Для статистики нужен numpy")
+        return
+
+    if args.bank:
+        started = time.perf_counter()
+        deals = bank_deals(args.bank)
+        totals = accumulate({}, deal_metrics(deals))
+        elapsed = time.perf_counter() - started
+        count = len(deals)
+    else:
+        totals, elapsed = run(args.deals, args.seed, args.batch)
+        count = args.deals
+
+    print(f"Раздач: {count}, время: {elapsed:.2f} с, раздач в секунду: {count / elapsed if elapsed else 0:.0f}")
+    for line in describe(totals):
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+# Замеры включаются переменной окружения до запуска: без нее декораторы
+# возвращают исходные функции и не добавляют ни одного вызова
+ENABLED = os.environ.get('SOLITAIRE_PERF', '') not in ('', '0')
+SAMPLE_LIMIT = 4096
+
+_timings = {}
+_counters = {}
+_lock = threading.Lock()
+_noop = nullcontext()
+
+
+class Timing:
+    __slots__ = ('count', 'total', 'samples')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=SAMPLE_LIMIT)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.samples.append(seconds)
+
+
+def record(name, seconds):
+    timing = _timings.get(name)
+    if timing is None:
+        with _lock:
+            timing = _timings.setdefault(name, Timing())
+    timing.add(seconds)
+
+
+def timed(name):
+    def decorate(func):
+        if not ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+
+@contextmanager
+def _section(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def section(name):
+    return _section(name) if ENABLED else _noop
+
+
+def count(name, amount=1):
+    if ENABLED:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + amount
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def snapshot():
+    # Перцентили считаются по последним SAMPLE_LIMIT замерам каждого участка
+    with _lock:
+        items = list(_timings.items())
+        counters = dict(_counters)
+    timings = {}
+    for name, timing in items:
+        ordered = sorted(timing.samples)
+        timings[name] = {
+            'count': timing.count,
+            'total': timing.total,
+            'p50': percentile(ordered, 0.50),
+            'p95': percentile(ordered, 0.95),
+            'p99': percentile(ordered, 0.99),
+            'max': ordered[-1] if ordered else 0.0,
+        }
+    return {'timings': timings, 'counters': counters}
+
+
+def report(limit=None):
+    data = snapshot()
+    timings = sorted(data['timings'].items(), key=lambda item: item[1]['total'], reverse=True)
+    lines = [f"{'участок':32} {'вызовов':>8} {'p50':>9} {'p95':>9} {'p99':>9}"]
+    for name, stat in timings[:limit]:
+        lines.append(f"{name:32} {stat['count']:>8} {stat['p50'] * 1e3:>7.2f}мс "
+                     f"{stat['p95'] * 1e3:>7.2f}мс {stat['p99'] * 1e3:>7.2f}мс")
+    for name, value in sorted(data['counters'].items()):
+        lines.append(f"{name:32} {value:>8}")
+    return "\n".join(lines)
+
+
+def export(path='perf_stats.jsonl'):
+    data = snapshot()
+    stamp = time.time()
+    with open(path, 'a', encoding='utf-8') as f:
+        for name, stat in data['timings'].items():
+            f.write(json.dumps(dict(time=stamp, name=name, kind='timing', **stat)) + '\n')
+        for name, value in data['counters'].items():
+            f.write(json.dumps({'time': stamp, 'name': name, 'kind': 'counter', 'value': value}) + '\n')
+    return len(data['timings']) + len(data['counters'])
+
+
+def reset():
+    with _lock:
+        _timings.clear()
+        _counters.clear()
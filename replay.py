@@ -0,0 +1,132 @@
+import argparse
+import struct
+
+from logic import (
+    Game_Solitaire, DRAW, WASTE_TO_TABLEAU, WASTE_TO_FOUNDATION,
+    TABLEAU_TO_TABLEAU, TABLEAU_TO_FOUNDATION
+)
+
+MAGIC = b'KLR1'
+# Заголовок: сигнатура, номер раздачи (-1 — неизвестен), порядок колоды из 52 кодов
+HEADER = struct.Struct('<4sq52s')
+RECORD_SIZE = 2
+NO_SEED = -1
+
+KINDS = (DRAW, WASTE_TO_TABLEAU, WASTE_TO_FOUNDATION, TABLEAU_TO_TABLEAU, TABLEAU_TO_FOUNDATION)
+KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+
+
+def encode_move(move):
+    # Байт 0: тип хода (4 бита) и источник; байт 1: индекс карты (5 бит) и приемник (3 бита)
+    kind = move[0]
+    source = index = target = 0
+    if kind in (WASTE_TO_TABLEAU, WASTE_TO_FOUNDATION):
+        target = move[1]
+    elif kind == TABLEAU_TO_TABLEAU:
+        source, index, target = move[1], move[2], move[3]
+    elif kind == TABLEAU_TO_FOUNDATION:
+        source, target = move[1], move[2]
+    return bytes((KIND_CODES[kind] << 4 | source, index << 3 | target))
+
+
+def decode_move(record):
+    kind = KINDS[record[0] >> 4]
+    source = record[0] & 0x0F
+    index = record[1] >> 3
+    target = record[1] & 0x07
+    if kind == DRAW:
+        return (DRAW,)
+    if kind in (WASTE_TO_TABLEAU, WASTE_TO_FOUNDATION):
+        return (kind, target)
+    if kind == TABLEAU_TO_TABLEAU:
+        return (kind, source, index, target)
+    return (kind, source, target)
+
+
+class ReplayWriter:
+    def __init__(self, path, seed, deal):
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, NO_SEED if seed is None else seed, deal))
+        self.count = 0
+
+    def write(self, move):
+        self.file.write(encode_move(move))
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ReplayReader:
+    def __init__(self, path, chunk_moves=4096):
+        self.file = open(path, 'rb')
+        self.chunk_size = chunk_moves * RECORD_SIZE
+        header = self.file.read(HEADER.size)
+        if len(header) < HEADER.size:
+            self.file.close()
+            raise ValueError("Файл повтора поврежден: неполный заголовок")
+        magic, seed, self.deal = HEADER.unpack(header)
+        if magic != MAGIC:
+            self.file.close()
+            raise ValueError("Файл не является повтором партии")
+        self.seed = None if seed == NO_SEED else seed
+
+    def __iter__(self):
+        # Ходы читаются блоками, файл целиком в память не загружается
+        while True:
+            chunk = self.file.read(self.chunk_size)
+            if not chunk:
+                return
+            for i in range(0, len(chunk) - 1, RECORD_SIZE):
+                yield decode_move(chunk[i:i + RECORD_SIZE])
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def save_replay(path, game):
+    with ReplayWriter(path, game.seed, game.deal) as writer:
+        for entry in game.history:
+            writer.write(entry[0])
+        return writer.count
+
+
+def load_replay(path):
+    with ReplayReader(path) as reader:
+        game = Game_Solitaire(reader.seed, reader.deal)
+        for number, move in enumerate(reader, 1):
+            if not game.apply_move(move):
+                raise ValueError(f"Недопустимый ход №{number}: {move}")
+    return game
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка сохраненных повторов партий")
+    parser.add_argument('paths', nargs='+', help="файлы повторов")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        try:
+            game = load_replay(path)
+        except (OSError, ValueError) as e:
+            print(f"{path}: ошибка — {e}")
+            continue
+        cards = sum(len(f) for f in game.foundations)
+        status = "победа" if game.is_won() else f"в фундаментах {cards} карт"
+        print(f"{path}: ходов {len(game.history)}, {status}")
+
+
+if __name__ == "__main__":
+    main()
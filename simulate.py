@@ -0,0 +1,106 @@
+import argparse
+import random
+import time
+
+from logic import (
+    Game_Solitaire, DRAW, WASTE_TO_TABLEAU, WASTE_TO_FOUNDATION,
+    TABLEAU_TO_TABLEAU, TABLEAU_TO_FOUNDATION
+)
+
+
+def random_policy(game, moves, rng):
+    return rng.choice(moves)
+
+
+def greedy_policy(game, moves, rng):
+    for move in moves:
+        if move[0] in (TABLEAU_TO_FOUNDATION, WASTE_TO_FOUNDATION):
+            return move
+
+    for move in moves:
+        if move[0] == TABLEAU_TO_TABLEAU:
+            source, index = move[1], move[2]
+            # Ход имеет смысл, только если открывает закрытую карту
+            if index > 0 and not game.tableau[source][index - 1].face_up:
+                return move
+
+    for move in moves:
+        if move[0] == WASTE_TO_TABLEAU:
+            return move
+
+    if (DRAW,) in moves:
+        return (DRAW,)
+    return None
+
+
+POLICIES = {
+    'random': random_policy,
+    'greedy': greedy_policy,
+}
+
+
+def play(seed, policy, max_moves=1000):
+    game = Game_Solitaire(seed)
+    rng = random.Random(seed)
+    moves_made = 0
+    idle_draws = 0
+
+    while moves_made < max_moves and not game.is_won():
+        moves = game.legal_moves()
+        if not moves:
+            break
+        move = policy(game, moves, rng)
+        if move is None:
+            break
+
+        # Полный круг по колоде без других ходов — партия застряла
+        if move[0] == DRAW:
+            idle_draws += 1
+            if idle_draws > len(game.deck) + len(game.waste):
+                break
+        else:
+            idle_draws = 0
+
+        game.apply_move(move)
+        moves_made += 1
+
+    return game.is_won(), moves_made
+
+
+def run(count, start_seed=0, policy=greedy_policy, max_moves=1000):
+    wins = 0
+    total_moves = 0
+    started = time.perf_counter()
+
+    for seed in range(start_seed, start_seed + count):
+        won, moves_made = play(seed, policy, max_moves)
+        wins += won
+        total_moves += moves_made
+
+    elapsed = time.perf_counter() - started
+    return {
+        'games': count,
+        'wins': wins,
+        'moves': total_moves,
+        'seconds': elapsed,
+        'games_per_second': count / elapsed if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетная симуляция партий без интерфейса")
+    parser.add_argument('-n', '--games', type=int, default=1000, help="количество партий")
+    parser.add_argument('--seed', type=int, default=0, help="номер первой раздачи")
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='greedy', help="стратегия выбора хода")
+    parser.add_argument('--max-moves', type=int, default=1000, help="предел ходов в одной партии")
+    args = parser.parse_args()
+
+    stats = run(args.games, args.seed, POLICIES[args.policy], args.max_moves)
+    print(f"Партий: {stats['games']}, побед: {stats['wins']} "
+          f"({stats['wins'] / stats['games']:.1%})")
+    print(f"Ходов: {stats['moves']}, время: {stats['seconds']:.2f} с, "
+          f"партий в секунду: {stats['games_per_second']:.1f}")
+
+
+if __name__ == "__main__":
+    main()
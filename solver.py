@@ -0,0 +1,185 @@
+import argparse
+import json
+import os
+import time
+
+import perf
+from logic import (
+    Game_Solitaire, PackedState, DRAW, WASTE_TO_TABLEAU, WASTE_TO_FOUNDATION,
+    TABLEAU_TO_FOUNDATION
+)
+
+WIN = 'win'
+LOSS = 'loss'
+UNKNOWN = 'unknown'
+
+
+def ordered_moves(game, pruned=None):
+    # В pruned отмечаются отброшенные ходы: после них проигрыш уже не доказан
+    foundation_moves = []
+    revealing = []
+    from_waste = []
+    other = []
+    draw = []
+
+    for move in game.legal_moves():
+        kind = move[0]
+        if kind in (TABLEAU_TO_FOUNDATION, WASTE_TO_FOUNDATION):
+            foundation_moves.append(move)
+        elif kind == WASTE_TO_TABLEAU:
+            from_waste.append(move)
+        elif kind == DRAW:
+            draw.append(move)
+        else:
+            source, index = move[1], move[2]
+            column = game.tableau[source]
+            if index == 0:
+                # Король с пустого основания в другую пустую стопку ничего не дает
+                if column[0].value != 13:
+                    other.append(move)
+            elif not column[index - 1].face_up:
+                revealing.append((-index, move))
+            elif game.find_foundation(column[index - 1]) is not None:
+                # Часть последовательности переносим, только чтобы освободить карту для фундамента
+                other.append(move)
+            elif pruned is not None:
+                pruned[0] = True
+
+    revealing.sort()
+    return foundation_moves + [move for _, move in revealing] + from_waste + other + draw
+
+
+@perf.timed('solver.solve')
+def solve(game, node_limit=200000, time_limit=None):
+    # Поиск меняет партию на месте, поэтому работает с копией, собранной из упакованной позиции
+    state = game if isinstance(game, PackedState) else game.pack()
+    game = Game_Solitaire.from_packed(state)
+    started = time.perf_counter()
+    deadline = started + time_limit if time_limit else None
+    seen = set()
+    nodes = 0
+    pruned = [False]
+
+    def finish(result):
+        perf.count('solver.nodes', nodes)
+        moves = [entry[0] for entry in game.history] if result == WIN else None
+        return {
+            'result': result,
+            'nodes': nodes,
+            'moves': moves,
+            'seconds': time.perf_counter() - started,
+        }
+
+    undo_count = len(game.autoplay())
+    if game.is_won():
+        return finish(WIN)
+    seen.add(game.zobrist)
+    frames = [[ordered_moves(game, pruned), 0, undo_count]]
+
+    while frames:
+        if nodes >= node_limit or (deadline and time.perf_counter() > deadline):
+            return finish(UNKNOWN)
+
+        frame = frames[-1]
+        moves, position, undo_count = frame
+        if position == len(moves):
+            frames.pop()
+            for _ in range(undo_count):
+                game.undo_move()
+            continue
+        frame[1] += 1
+
+        game.apply_move(moves[position])
+        nodes += 1
+        undo_count = len(game.autoplay()) + 1
+        if game.is_won():
+            return finish(WIN)
+
+        if game.zobrist in seen:
+            for _ in range(undo_count):
+                game.undo_move()
+            continue
+        seen.add(game.zobrist)
+        frames.append([ordered_moves(game, pruned), 0, undo_count])
+
+    # Перебор исчерпан, но если эвристика отбрасывала ходы, это не доказательство проигрыша
+    return finish(UNKNOWN if pruned[0] else LOSS)
+
+
+def best_move(game, node_limit=20000, time_limit=2.0):
+    # Упакованную позицию (снимок из потока подсказок) разворачиваем один раз:
+    # эвристике ниже нужна полноценная партия
+    if isinstance(game, PackedState):
+        game = Game_Solitaire.from_packed(game)
+    result = solve(game, node_limit, time_limit)
+    if result['result'] == WIN and result['moves']:
+        return result['moves'][0]
+
+    # Решение не найдено в пределах поиска — лучший ход по эвристике
+    moves = ordered_moves(game)
+    return moves[0] if moves else None
+
+
+def analyze_seed(task):
+    seed, node_limit, time_limit = task
+    result = solve(Game_Solitaire(seed), node_limit, time_limit)
+    return {
+        'seed': seed,
+        'result': result['result'],
+        'nodes': result['nodes'],
+        'length': len(result['moves']) if result['moves'] else None,
+        'seconds': round(result['seconds'], 4),
+    }
+
+
+def completed_seeds(path):
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)['seed'])
+            except (ValueError, KeyError):
+                # Оборванная последняя строка после аварийной остановки
+                continue
+    return done
+
+
+def analyze(seeds, output, workers=None, node_limit=200000, time_limit=None, chunksize=4):
+    done = completed_seeds(output)
+    tasks = ((seed, node_limit, time_limit) for seed in seeds if seed not in done)
+    counts = {WIN: 0, LOSS: 0, UNKNOWN: 0}
+
+    # multiprocessing нужен только пакетному анализу, игра его не загружает
+    from multiprocessing import Pool, cpu_count
+
+    with Pool(workers or cpu_count()) as pool, open(output, 'a', encoding='utf-8') as out:
+        for record in pool.imap_unordered(analyze_seed, tasks, chunksize):
+            out.write(json.dumps(record) + '\n')
+            out.flush()
+            counts[record['result']] += 1
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Анализ решаемости раздач")
+    parser.add_argument('--start', type=int, default=0, help="номер первой раздачи")
+    parser.add_argument('--count', type=int, default=1000, help="количество раздач")
+    parser.add_argument('--workers', type=int, default=None, help="количество процессов")
+    parser.add_argument('--nodes', type=int, default=200000, help="предел узлов поиска на раздачу")
+    parser.add_argument('--time', type=float, default=None, help="предел времени на раздачу, с")
+    parser.add_argument('--output', default='solver_results.jsonl', help="файл результатов (дописывается)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    counts = analyze(range(args.start, args.start + args.count), args.output,
+                     args.workers, args.nodes, args.time)
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    print(f"Проанализировано раздач: {total} за {elapsed:.1f} с")
+    print(f"Решаемых: {counts[WIN]}, нерешаемых: {counts[LOSS]}, не определено: {counts[UNKNOWN]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+import pytest
+
+from logic import Game_Solitaire
+from dealbank import NO_SEED, STATUS_WIN, encode_record, decode_record
+
+
+@pytest.mark.parametrize('seed', [0, 7, NO_SEED - 1, None])
+def test_record_round_trip(seed):
+    deal = Game_Solitaire(3).deal
+    record = decode_record(encode_record(deal, STATUS_WIN, 1234, seed))
+    assert record == {'deal': deal, 'status': STATUS_WIN, 'difficulty': 1234, 'seed': seed}
+
+
+@pytest.mark.parametrize('seed', [NO_SEED, 2 ** 32 + 7, -1])
+def test_record_rejects_seed_out_of_range(seed):
+    with pytest.raises(ValueError):
+        encode_record(Game_Solitaire(3).deal, seed=seed)
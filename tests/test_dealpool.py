@@ -0,0 +1,39 @@
+import time
+
+from logic import Game_Solitaire
+from dealbank import STATUS_WIN, STATUS_LOSS, encode_record
+from dealpool import DealPool
+
+
+def write_bank(path, records):
+    with open(path, 'wb') as f:
+        for seed, status, difficulty in records:
+            f.write(encode_record(Game_Solitaire(seed).deal, status, difficulty, seed))
+
+
+def test_fill_from_bank_reports_levels_without_records(tmp_path):
+    bank_path = tmp_path / 'deals.bin'
+    write_bank(bank_path, [(1, STATUS_WIN, 100), (2, STATUS_WIN, 200), (3, STATUS_LOSS, 1000)])
+    pool = DealPool(str(bank_path), target=5)
+    assert pool.fill_from_bank() == ['medium', 'hard']
+    # Записей меньше, чем нужно, — очередь добирается повторной выборкой
+    assert pool.sizes()['easy'] == 2
+    assert pool.fill_from_bank() == ['medium', 'hard']
+    assert pool.sizes() == {'easy': 4, 'medium': 0, 'hard': 0}
+
+
+def test_run_refills_from_bank_without_solving(tmp_path):
+    bank_path = tmp_path / 'deals.bin'
+    write_bank(bank_path, [(1, STATUS_WIN, 100), (2, STATUS_WIN, 1000), (3, STATUS_WIN, 9000)])
+    pool = DealPool(str(bank_path), target=2)
+    pool.start()
+    try:
+        for _ in range(5):
+            deadline = time.monotonic() + 3
+            while pool.missing() and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert pool.sizes() == {'easy': 2, 'medium': 2, 'hard': 2}
+            assert pool.take('medium').seed == 2
+        assert pool.executor is None
+    finally:
+        pool.stop()
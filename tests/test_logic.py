@@ -0,0 +1,106 @@
+import random
+
+import pytest
+
+from logic import (
+    Game_Solitaire, IN_DECK, IN_WASTE, IN_FOUNDATION, IN_TABLEAU,
+    DRAW, WASTE_TO_FOUNDATION, TABLEAU_TO_TABLEAU
+)
+
+
+def check_indexes(game):
+    # Индексы, обновляемые ходами, должны совпадать с посчитанными заново
+    assert game.zobrist == game.compute_zobrist()
+    assert game.legal_moves() == Game_Solitaire.from_packed(game.pack()).legal_moves()
+
+    for i, column in enumerate(game.tableau):
+        assert game.hidden[i] == sum(not card.face_up for card in column)
+        assert all(not card.face_up for card in column[:game.hidden[i]])
+        for index, card in enumerate(column):
+            assert game.locate(card.code) == (IN_TABLEAU, i, index)
+    for i, foundation in enumerate(game.foundations):
+        for index, card in enumerate(foundation):
+            assert game.locate(card.code) == (IN_FOUNDATION, i, index)
+            assert game.heights[card.suit_index] == len(foundation)
+            assert game.suit_foundation[card.suit_index] == i
+    for index, card in enumerate(game.deck):
+        assert game.locate(card.code) == (IN_DECK, None, index)
+    for index, card in enumerate(game.waste):
+        assert game.locate(card.code) == (IN_WASTE, None, index)
+
+    assert game.foundation_total == sum(len(f) for f in game.foundations)
+    assert game.empty_column == game.first_empty_column()
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_indexes_follow_apply_undo_redo(seed):
+    game = Game_Solitaire(seed)
+    rng = random.Random(seed)
+    check_indexes(game)
+    for _ in range(300):
+        roll = rng.random()
+        if roll < 0.15 and game.history:
+            game.undo_move()
+        elif roll < 0.25 and game.redo_stack:
+            game.redo_move()
+        else:
+            moves = game.legal_moves()
+            if not moves:
+                break
+            assert game.apply_move(rng.choice(moves))
+        check_indexes(game)
+
+
+def test_undo_restores_initial_position():
+    game = Game_Solitaire(7)
+    start = game.pack()
+    rng = random.Random(7)
+    for _ in range(200):
+        moves = game.legal_moves()
+        if not moves:
+            break
+        game.apply_move(rng.choice(moves))
+    while game.history:
+        game.undo_move()
+    assert game.pack() == start
+    check_indexes(game)
+
+
+def touched_columns(move):
+    kind = move[0]
+    if kind in (DRAW, WASTE_TO_FOUNDATION):
+        return ()
+    if kind == TABLEAU_TO_TABLEAU:
+        return (move[1], move[3])
+    return (move[1],)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_packed_child_matches_apply_move(seed):
+    game = Game_Solitaire(seed)
+    state = game.pack()
+    rng = random.Random(seed)
+    for _ in range(300):
+        moves = game.legal_moves()
+        assert state.legal_moves() == moves
+        assert state.is_won() == game.is_won()
+        if not moves:
+            break
+        move = rng.choice(moves)
+        game.apply_move(move)
+        child = state.child(move)
+        assert child == game.pack()
+        # Стопки, которых ход не касался, остаются общими с родителем
+        for i, (before, after) in enumerate(zip(state.columns, child.columns)):
+            if i not in touched_columns(move):
+                assert after is before
+        state = child
+
+
+def test_from_packed_does_not_share_cards():
+    game = Game_Solitaire(3)
+    copy = Game_Solitaire.from_packed(game.pack())
+    assert copy.canonical_key() == game.canonical_key()
+    assert copy.zobrist == game.zobrist
+    assert not any(a is b for x, y in zip(copy.tableau, game.tableau) for a, b in zip(x, y))
+    assert copy.history == []
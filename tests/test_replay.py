@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+from logic import Game_Solitaire, WASTE_TO_FOUNDATION
+from replay import RECORD_SIZE, HEADER, encode_move, decode_move, save_replay, load_replay
+
+
+def play(game, rng, steps=300):
+    # Случайные ходы с откатами: в файл попадает только оставшаяся история
+    for _ in range(steps):
+        if rng.random() < 0.2 and game.history:
+            game.undo_move()
+            continue
+        moves = game.legal_moves()
+        if not moves:
+            break
+        game.apply_move(rng.choice(moves))
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_replay_round_trip(seed, tmp_path):
+    game = Game_Solitaire(seed)
+    play(game, random.Random(seed))
+    for entry in game.history:
+        assert decode_move(encode_move(entry[0])) == entry[0]
+
+    path = tmp_path / 'game.klr'
+    assert save_replay(str(path), game) == len(game.history)
+    assert path.stat().st_size == HEADER.size + RECORD_SIZE * len(game.history)
+
+    loaded = load_replay(str(path))
+    assert loaded.seed == seed
+    assert loaded.pack() == game.pack()
+    assert [entry[0] for entry in loaded.history] == [entry[0] for entry in game.history]
+
+
+def test_replay_keeps_deal_without_seed(tmp_path):
+    source = Game_Solitaire(5)
+    game = Game_Solitaire(deal=source.deal)
+    play(game, random.Random(5), 100)
+    path = tmp_path / 'game.klr'
+    save_replay(str(path), game)
+    loaded = load_replay(str(path))
+    assert loaded.seed is None
+    assert loaded.pack() == game.pack()
+
+
+def test_replay_rejects_illegal_move(tmp_path):
+    game = Game_Solitaire(1)
+    path = tmp_path / 'game.klr'
+    save_replay(str(path), game)
+    with open(path, 'ab') as f:
+        # Перенос из пустого сброса недопустим в начальной позиции
+        f.write(encode_move((WASTE_TO_FOUNDATION, 0)))
+    with pytest.raises(ValueError):
+        load_replay(str(path))
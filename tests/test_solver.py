@@ -0,0 +1,29 @@
+import pytest
+
+from logic import Game_Solitaire
+import solver
+
+
+# Раздачи, которые решатель проходит за 20000 узлов
+SOLVED_SEEDS = (2, 3, 4, 6, 7)
+
+
+@pytest.mark.parametrize('seed', SOLVED_SEEDS)
+def test_solution_replays_to_win(seed):
+    result = solver.solve(Game_Solitaire(seed), 20000)
+    assert result['result'] == solver.WIN
+    game = Game_Solitaire(seed)
+    for move in result['moves']:
+        assert game.apply_move(move)
+    assert game.is_won()
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_best_move_falls_back_for_packed_position(seed):
+    # Поиск на десяти узлах ничего не решает, подсказка берется из эвристики
+    game = Game_Solitaire(seed)
+    state = game.pack()
+    assert solver.solve(state, node_limit=10)['result'] == solver.UNKNOWN
+    move = solver.best_move(state, node_limit=10)
+    assert move in game.legal_moves()
+    assert solver.best_move(game, node_limit=10) == move
@@ -0,0 +1,366 @@
+import datetime
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import database
+
+# Оба хранилища проверяются одним набором тестов. PostgreSQL подключается, если задана
+# SOLITAIRE_TEST_POSTGRES с именем отдельной базы (таблицы в ней пересоздаются);
+# остальные параметры берутся из PGHOST, PGPORT, PGUSER, PGPASSWORD
+POSTGRES_DATABASE = os.environ.get('SOLITAIRE_TEST_POSTGRES')
+TABLES = ('game_results', 'player_stats', 'difficulty_stats', 'daily_stats')
+
+
+def make_sqlite(tmp_path):
+    return database.SQLiteBackend(str(tmp_path / 'results.db'))
+
+
+def make_postgres(tmp_path):
+    if not POSTGRES_DATABASE:
+        pytest.skip("SOLITAIRE_TEST_POSTGRES не задана")
+    if not database.PSYCOPG2_AVAILABLE:
+        pytest.skip("psycopg2 не установлен")
+    db = database.DatabaseManager(
+        host=os.environ.get('PGHOST', 'localhost'),
+        port=int(os.environ.get('PGPORT', 5432)),
+        database=POSTGRES_DATABASE,
+        user=os.environ.get('PGUSER', 'postgres'),
+        password=os.environ.get('PGPASSWORD', ''),
+    )
+    if not db.connect():
+        pytest.skip("PostgreSQL недоступен")
+    with db.cursor(ensure_schema=False) as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {', '.join(TABLES)} CASCADE;")
+    database._schema_ready.discard((db.host, db.port, db.database))
+    return db
+
+
+@pytest.fixture(params=[make_sqlite, make_postgres], ids=['sqlite', 'postgres'])
+def db(request, tmp_path):
+    backend = request.param(tmp_path)
+    assert backend.init_database()
+    yield backend
+    backend.close()
+
+
+def row_of(db, name):
+    return next(row for row in db.get_leaderboard(1000) if row[1] == name)
+
+
+def difficulty_stats(db):
+    return {row[0]: tuple(row[1:]) for row in db.get_stats()['difficulties']}
+
+
+def test_init_database_is_idempotent(db):
+    assert db.init_database()
+    assert db.get_results() == []
+
+
+def test_save_result_upserts_by_player(db):
+    assert db.save_result("anna", 300, False, 'easy', 0, 3)
+    assert db.save_result("anna", 120, True, 'hard', 900, 1)
+
+    rows = db.get_results()
+    assert len(rows) == 1
+    _, name, secs, won, difficulty, score, hints = rows[0]
+    assert (name, secs, bool(won), difficulty, score, hints) == ("anna", 120, True, 'hard', 900, 1)
+
+
+def test_save_results_keeps_last_row_per_player(db):
+    assert db.save_results([
+        ("boris", 200, True, 'medium', 500, 2),
+        ("vera", 100, True, 'easy', 800, 5),
+        ("boris", 90, True, 'medium', 950, 0),
+    ])
+    assert len(db.get_results(10)) == 2
+    assert row_of(db, "boris")[5] == 950
+
+
+def test_player_name_exists(db):
+    db.save_result("gleb", 100, True)
+    assert db.player_name_exists("gleb")
+    assert not db.player_name_exists("nobody")
+
+    assert db.load_name_cache()
+    assert db.player_name_exists("gleb")
+    assert not db.player_name_exists("nobody")
+    db.save_result("dina", 100, True)
+    assert db.player_name_exists("dina")
+
+
+def fill_leaderboard(db):
+    rows = []
+    for i in range(60):
+        # Повторяющиеся очки и время проверяют разбор ничьих по id
+        rows.append((f"player{i:02d}", 60 + i % 4 * 30 if i % 7 else None, i % 2 == 0,
+                     ('easy', 'medium', 'hard')[i % 3], (i % 5) * 100 if i % 11 else None, 3))
+    db.save_results(rows)
+
+
+def all_pages(db, size, **filters):
+    rows = []
+    after = None
+    while True:
+        page = db.get_leaderboard(size, after, **filters)
+        assert len(page) <= size
+        if not page:
+            return rows
+        rows.extend(page)
+        after = page[-1]
+
+
+@pytest.mark.parametrize('filters', [
+    {},
+    {'difficulty': 'medium'},
+    {'won': True},
+    {'difficulty': 'easy', 'won': True},
+    {'difficulty': 'hard', 'won': False},
+])
+def test_leaderboard_keyset_paging(db, filters):
+    fill_leaderboard(db)
+    expected = sorted(
+        (row for row in db.get_results(1000)
+         if filters.get('difficulty', row[4]) == row[4] and filters.get('won', bool(row[3])) == bool(row[3])),
+        key=database.leaderboard_key,
+    )
+    assert expected
+    assert all_pages(db, 7, **filters) == expected
+    assert db.get_leaderboard(1000, None, **filters) == expected
+
+
+def test_stats_follow_inserts_and_upserts(db):
+    db.save_result("egor", 100, True, 'easy', 700, 3)
+    db.save_result("zhanna", 200, False, 'easy', 0, 3)
+    db.save_result("ilya", 150, True, 'hard', 400, 3)
+    assert difficulty_stats(db) == {
+        'easy': (2, 1, 700, 700, 100),
+        'hard': (1, 1, 400, 400, 150),
+    }
+
+    # Повторная партия игрока заменяет старый вклад в сводки, а рекорды не уменьшаются
+    db.save_result("egor", 300, False, 'hard', 0, 3)
+    stats = difficulty_stats(db)
+    assert stats['easy'][:3] == (1, 0, 0)
+    assert stats['hard'][:3] == (2, 1, 400)
+
+    player = db.get_stats("egor")['player']
+    assert player[0] == "egor"
+    assert tuple(player[1:4]) == (1, 0, 0)
+    assert player[4] == 700
+
+    daily = db.get_stats(days=7)['daily']
+    assert {(row[1], row[2]) for row in daily} == {('easy', 1), ('hard', 2)}
+    assert all(isinstance(row[0], datetime.date) for row in daily)
+
+
+def test_sqlite_leaderboard_page_uses_index_seek(tmp_path):
+    db = make_sqlite(tmp_path)
+    assert db.init_database()
+    filters = (
+        ("", ()),
+        ("difficulty = ? AND ", ('easy',)),
+        ("won = ? AND ", (1,)),
+        ("difficulty = ? AND won = ? AND ", ('easy', 1)),
+    )
+    for prefix, params in filters:
+        with db.cursor() as cursor:
+            cursor.execute(f"""
+                EXPLAIN QUERY PLAN
+                SELECT id FROM game_results
+                WHERE {prefix}{database.SQLITE_LEADERBOARD_AFTER}
+                ORDER BY {database.LEADERBOARD_KEY}
+                LIMIT 20;
+            """, params + (0, 0, 0, 0, 0))
+            plan = " ".join(row[3] for row in cursor.fetchall())
+        # Страница читается из индекса по порядку, без отдельной сортировки
+        assert plan.startswith("SEARCH") and "<expr>>?" in plan, plan
+        assert "TEMP B-TREE" not in plan, plan
+    db.close()
+
+
+class FlakyBackend(database.SQLiteBackend):
+    # Хранилище, запись в которое можно «уронить», чтобы проверить откладывание на диск
+    def __init__(self, path):
+        super().__init__(path)
+        self.failing = False
+        self.batches = []
+
+    def write_results(self, rows):
+        if self.failing:
+            return False
+        self.batches.append(len(rows))
+        return super().write_results(rows)
+
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture
+def flaky(tmp_path):
+    backend = FlakyBackend(str(tmp_path / 'flaky.db'))
+    assert backend.init_database()
+    yield backend
+    backend.close()
+
+
+def make_writer(flaky, tmp_path, **kwargs):
+    kwargs.setdefault('flush_seconds', 60)
+    kwargs.setdefault('retry_seconds', 60)
+    return database.ResultWriter(flaky, spool_path=str(tmp_path / 'spool.jsonl'), **kwargs)
+
+
+def names(db):
+    return {row[1] for row in db.get_results(100)}
+
+
+def test_writer_spools_failed_batch_and_replays_it(flaky, tmp_path):
+    writer = make_writer(flaky, tmp_path)
+    results = []
+    flaky.failing = True
+    writer.save_result("lev", 100, True, callback=results.append)
+    assert writer.flush()
+    assert results == [False]
+    assert os.path.exists(writer.spool_path)
+    assert names(flaky) == set()
+
+    # После восстановления удачная запись досылает отложенное и удаляет файл
+    flaky.failing = False
+    writer.save_result("mila", 90, True, callback=results.append)
+    assert writer.flush()
+    writer.stop()
+    assert results == [False, True]
+    assert names(flaky) == {"lev", "mila"}
+    assert not os.path.exists(writer.spool_path)
+
+
+def test_writer_replays_spool_on_start(flaky, tmp_path):
+    spool_path = tmp_path / 'spool.jsonl'
+    spool_path.write_text('["nina", 80, true, "easy", 700, 3]\n', encoding='utf-8')
+    writer = make_writer(flaky, tmp_path)
+    assert writer.flush()
+    writer.stop()
+    assert names(flaky) == {"nina"}
+    assert not spool_path.exists()
+
+
+def test_writer_spools_when_queue_is_full(flaky, tmp_path):
+    writer = make_writer(flaky, tmp_path, max_pending=1)
+    release = threading.Event()
+    started = threading.Event()
+
+    def blocked_query():
+        started.set()
+        release.wait(5)
+        return []
+
+    # Поток записи занят чтением, единственное место в очереди заполнено
+    writer.read(blocked_query)
+    assert started.wait(5)
+    writer.save_result("oleg", 100, True)
+    results = []
+    writer.save_result("polina", 100, True, callback=results.append)
+    assert results == [False]
+    assert os.path.exists(writer.spool_path)
+
+    release.set()
+    assert writer.flush()
+    writer.stop()
+    assert names(flaky) == {"oleg", "polina"}
+    assert not os.path.exists(writer.spool_path)
+
+
+def test_writer_flushes_full_batch(flaky, tmp_path):
+    writer = make_writer(flaky, tmp_path, batch_size=3)
+    for i in range(3):
+        writer.save_result(f"batch{i}", 100, True)
+    assert wait_for(lambda: len(names(flaky)) == 3)
+    writer.stop()
+    assert flaky.batches == [3]
+
+
+def test_writer_flushes_after_timeout(flaky, tmp_path):
+    writer = make_writer(flaky, tmp_path, batch_size=100, flush_seconds=0.1)
+    writer.save_result("roman", 100, True)
+    assert wait_for(lambda: names(flaky) == {"roman"})
+    writer.stop()
+    assert flaky.batches == [1]
+
+
+def test_writer_flushes_before_read(flaky, tmp_path):
+    writer = make_writer(flaky, tmp_path, batch_size=100)
+    writer.save_result("sofia", 100, True)
+    results = []
+    writer.get_results(10, callback=results.append)
+    assert wait_for(lambda: results)
+    writer.stop()
+    assert [row[1] for row in results[0]] == ["sofia"]
+
+
+def test_writer_keeps_played_at_of_spooled_rows(flaky, tmp_path):
+    writer = make_writer(flaky, tmp_path)
+    flaky.failing = True
+    writer.save_result("taras", 100, True, 'easy', 300, 3)
+    assert writer.flush()
+    writer.stop()
+    with open(writer.spool_path, encoding='utf-8') as f:
+        played_at = datetime.datetime.fromisoformat(json.loads(f.readline())[6])
+    assert abs(datetime.datetime.now(datetime.timezone.utc) - played_at).total_seconds() < 60
+
+    # Партия, отложенная три дня назад, попадает в сводку своего дня, а не дня досылки
+    three_days_ago = played_at - datetime.timedelta(days=3)
+    spool_path = tmp_path / 'spool.jsonl'
+    spool_path.write_text(
+        json.dumps(["taras", 100, True, "easy", 300, 3, three_days_ago.isoformat()]) + '\n', encoding='utf-8'
+    )
+    flaky.failing = False
+    writer = make_writer(flaky, tmp_path)
+    assert writer.flush()
+    writer.stop()
+    daily = flaky.get_stats(days=7)['daily']
+    assert [(row[0], row[1], row[2]) for row in daily] == [(three_days_ago.date(), 'easy', 1)]
+
+
+def test_writer_checks_player_name_off_the_caller_thread(flaky, tmp_path):
+    flaky.save_result("ulyana", 100, True)
+    writer = make_writer(flaky, tmp_path)
+    threads = []
+    results = []
+
+    def on_answer(exists):
+        threads.append(threading.current_thread())
+        results.append(exists)
+
+    # Кеш не загружен — за ответом идем в поток записи
+    writer.player_name_exists("ulyana", callback=on_answer)
+    writer.player_name_exists("nobody", callback=on_answer)
+    assert wait_for(lambda: len(results) == 2)
+    assert results == [True, False]
+    assert threads == [writer.thread, writer.thread]
+
+    # Уверенный ответ кеша приходит сразу
+    assert flaky.load_name_cache()
+    writer.player_name_exists("nobody", callback=on_answer)
+    assert results[-1] is False and threads[-1] is threading.current_thread()
+    writer.stop()
+
+
+def test_writer_reloads_name_cache_after_success(flaky, tmp_path):
+    flaky.name_cache_failed = True
+    writer = make_writer(flaky, tmp_path)
+    writer.save_result("fedor", 100, True)
+    assert writer.flush()
+    assert wait_for(lambda: flaky.name_cache is not None and flaky.name_cache.ready)
+    assert not flaky.name_cache_failed
+    assert "fedor" in flaky.name_cache.bloom
+    assert flaky.cached_player_name("nobody") is False
+    writer.stop()